@@ -1 +1 @@
-from .loop import EventLoop, EventLoopItem
\ No newline at end of file
+from .loop import EventLoop, EventLoopItem, ScheduleHint, ScheduleHintError, HintType
\ No newline at end of file
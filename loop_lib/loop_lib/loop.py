@@ -1,14 +1,67 @@
 from datetime import datetime, timedelta
+from enum import Enum
 from pydantic import BaseModel
 import asyncio, time
 import logging
-from typing import Any, Callable, List, Dict
+from typing import Any, Callable, List, Dict, Optional, Set
+
+class HintType(str, Enum):
+    SOONER = "sooner"
+    BACKOFF = "backoff"
+    DELAY = "delay"
+
+class ScheduleHint(BaseModel):
+    """Подсказка планировщику о следующем запуске функции."""
+    type: HintType
+    delay: float = 0
+
+    @classmethod
+    def sooner(cls, delay: float = 0):
+        """Запустить снова через delay секунд и сбросить backoff."""
+        return cls(type=HintType.SOONER, delay=delay)
+
+    @classmethod
+    def backoff(cls):
+        """Работы нет — увеличить интервал так же, как при ошибке."""
+        return cls(type=HintType.BACKOFF)
+
+    @classmethod
+    def after(cls, delay: float):
+        """Следующий запуск ровно через delay секунд."""
+        return cls(type=HintType.DELAY, delay=delay)
+
+class ScheduleHintError(Exception):
+    """Позволяет функции прервать выполнение и передать подсказку планировщику."""
+    def __init__(self, hint: ScheduleHint, message: str = ""):
+        super().__init__(message or hint.type.value)
+        self.hint = hint
 
 class EventLoopItem(BaseModel):
     name: str
     interval: int
     function: Callable[[], Any]
-    next_run: datetime
+    next_run: Optional[datetime]
+    max_interval: Optional[float] = None
+    backoff_factor: float = 2.0
+    backoff_level: int = 0
+    triggered: bool = False
+    after: List[str] = []
+    # прогон — номера запусков корневых функций, от которых пришёл запуск: {корень: номер}
+    runs: int = 0
+    pending_run: Optional[Dict[str, int]] = None
+    completed: Dict[str, Dict[str, int]] = {}
+
+    def backoff_limit(self) -> float:
+        limit = self.max_interval if self.max_interval is not None else self.interval
+        return max(limit, self.interval)
+
+    def backoff_interval(self) -> float:
+        return min(self.interval * self.backoff_factor ** self.backoff_level, self.backoff_limit())
+
+def _is_older(tag: Dict[str, int], other: Dict[str, int]) -> bool:
+    """Прогон tag запущен раньше other хотя бы одним общим корнем."""
+    return any(tag[root] < other[root] for root in tag.keys() & other.keys())
+
 
 class EventLoop:
     def __init__(self, logger = None):
@@ -16,21 +69,77 @@ class EventLoop:
         self.tasks: Dict[str, asyncio.Task] = {}
         self.running = False
         self.logger = logger or logging.getLogger(__name__)
+        self._wakeup = asyncio.Event()
 
-    def register(self, key: str, function: Callable[[], Any], interval: int = 0):
+    def register(
+        self,
+        key: str,
+        function: Callable[[], Any],
+        interval: int = 0,
+        max_interval: Optional[float] = None,
+        backoff_factor: float = 2.0,
+        after: Optional[List[str]] = None,
+    ):
+        """
+        :param max_interval: верхняя граница интервала при backoff (по умолчанию равна interval — без backoff)
+        :param backoff_factor: множитель интервала за каждую подряд идущую ошибку или подсказку backoff
+        :param after: ключи функций, после успешного завершения которых запускается эта функция.
+            Такая функция не запускается по интервалу — только по завершении всех зависимостей или через trigger()
+            Завершения зависимостей учитываются в пределах одного прогона корневых функций
+        """
+        after = list(after or [])
+        self._check_cycle(key, after)
         self.functions[key] = EventLoopItem(
             name=key,
             function=function,
             interval=interval,
-            next_run=datetime.now()
+            next_run=None if after else datetime.now(),
+            max_interval=max_interval,
+            backoff_factor=backoff_factor,
+            after=after,
         )
 
+    def _check_cycle(self, key: str, after: List[str]):
+        stack = list(after)
+        visited: Set[str] = set()
+        while stack:
+            current = stack.pop()
+            if current == key:
+                raise ValueError(f"Циклическая зависимость функции {key}")
+            if current in visited:
+                continue
+            visited.add(current)
+            if current in self.functions:
+                stack.extend(self.functions[current].after)
+
     def unregister(self, key: str):
         self.functions.pop(key, None)
         task = self.tasks.pop(key, None)
         if task and not task.done():
             task.cancel()
 
+    def trigger(self, key: str) -> bool:
+        """
+        Запускает зарегистрированную функцию как можно скорее.
+        Повторные вызовы, пока функция ожидает запуска или выполняется, объединяются в один запуск.
+        Вызывать из потока event loop (из других потоков — через loop.call_soon_threadsafe).
+        """
+        item = self.functions.get(key)
+        if item is None:
+            self.logger.warning(f"Функция {key} не зарегистрирована")
+            return False
+        if item.triggered:
+            return True
+        item.triggered = True
+        if not self._is_active(key):
+            item.next_run = datetime.now()
+            self._wakeup.set()
+        return True
+
+    def _is_active(self, key: str) -> bool:
+        task = self.tasks.get(key)
+        return task is not None and not task.done()
+
     def clear(self):
         self.functions.clear()
         for task in self.tasks.values():
@@ -39,21 +148,99 @@ class EventLoop:
         self.tasks.clear()
 
 
-    async def _run_task(self, item: EventLoopItem):
+    async def _run_task(self, item: EventLoopItem, run: Optional[Dict[str, int]] = None):
+        if run is None:
+            # запуск по расписанию или trigger() начинает новый прогон
+            item.runs += 1
+            run = {item.name: item.runs}
         start = time.monotonic()
+        started = datetime.now()
+        hint: Optional[ScheduleHint] = None
+        failed = False
+        interrupted = False
         try:
             self.logger.info(f"Функция {item.name} запущена")
             if asyncio.iscoroutinefunction(item.function):
-                await item.function()
+                result = await item.function()
             else:
                 loop = asyncio.get_event_loop()
-                await loop.run_in_executor(None, item.function)
+                result = await loop.run_in_executor(None, item.function)
+            if isinstance(result, ScheduleHint):
+                hint = result
+        except ScheduleHintError as e:
+            self.logger.info(f"Функция {item.name} прервана с подсказкой {e.hint.type.value}")
+            hint = e.hint
+            interrupted = True
         except Exception as e:
             self.logger.error(f"Ошибка выполнения функции {item.name}: {e}")
+            failed = True
         finally:
             elapsed = time.monotonic() - start
             self.logger.info(f"Функция {item.name} завершена за {elapsed:.2f} сек")
+        self._reschedule(item, started, hint, failed)
+        self._notify_dependents(item.name, not (failed or interrupted), run)
+        if item.triggered:
+            # trigger() пришёл во время выполнения — запускаем ещё раз сразу
+            item.next_run = datetime.now()
+            self._wakeup.set()
+
+    def _reschedule(self, item: EventLoopItem, started: datetime, hint: Optional[ScheduleHint], failed: bool):
+        # одноразовые функции уже удалены из расписания, зависимые запускаются по завершении зависимостей
+        if item.interval <= 0 or item.after:
+            return
+        if failed or (hint and hint.type == HintType.BACKOFF):
+            # после достижения max_interval уровень не растёт, иначе backoff_factor ** backoff_level переполняется
+            if item.backoff_factor > 1 and item.backoff_interval() < item.backoff_limit():
+                item.backoff_level += 1
+            interval = item.backoff_interval()
+            item.next_run = started + timedelta(seconds=interval)
+            if interval > item.interval:
+                self.logger.info(f"Функция {item.name}: backoff, следующий запуск через {interval:.2f} сек")
+            return
+        item.backoff_level = 0
+        if hint is not None:
+            # SOONER и DELAY отсчитываются от момента завершения
+            item.next_run = datetime.now() + timedelta(seconds=hint.delay)
+
 
+    def _notify_dependents(self, key: str, success: bool, run: Dict[str, int]):
+        for dependent in list(self.functions.values()):
+            if key not in dependent.after:
+                continue
+            if not success:
+                self._skip_downstream(dependent, key, run)
+                continue
+            if any(_is_older(run, tag) for tag in dependent.completed.values()):
+                # завершение из прогона, который уже обогнал более новый
+                continue
+            # завершения прошлых прогонов тех же корней устарели
+            dependent.completed = {
+                upstream: tag for upstream, tag in dependent.completed.items()
+                if upstream != key and not _is_older(tag, run)
+            }
+            dependent.completed[key] = run
+            if dependent.completed.keys() >= set(dependent.after):
+                merged: Dict[str, int] = {}
+                for tag in dependent.completed.values():
+                    merged.update(tag)
+                dependent.completed = {}
+                dependent.pending_run = merged
+                self.trigger(dependent.name)
+
+    def _skip_downstream(self, item: EventLoopItem, failed: str, run: Dict[str, int], visited: Optional[Set[str]] = None):
+        # отбрасываем завершения упавшего прогона по всей цепочке ниже упавшей функции
+        visited = visited if visited is not None else set()
+        if item.name in visited:
+            return
+        visited.add(item.name)
+        item.completed = {
+            upstream: tag for upstream, tag in item.completed.items()
+            if not any(tag.get(root) == number for root, number in run.items())
+        }
+        self.logger.warning(f"Функция {item.name} пропущена — зависимость {failed} завершилась с ошибкой")
+        for dependent in list(self.functions.values()):
+            if item.name in dependent.after:
+                self._skip_downstream(dependent, failed, run, visited)
 
     def handle_task_done(self, task: asyncio.Task):
         if exception := task.exception():
@@ -67,15 +254,20 @@ class EventLoop:
             to_remove = []
             self.logger.info("start loop iter")
             for key, item in list(self.functions.items()):
-                if now >= item.next_run:
-                    if key in self.tasks and not self.tasks[key].done():
-                        self.logger.warning(f"Пропускаем запуск {key} — предыдущая задача ещё работает")
+                if item.next_run is not None and now >= item.next_run:
+                    if self._is_active(key):
+                        if not item.triggered:
+                            self.logger.warning(f"Пропускаем запуск {key} — предыдущая задача ещё работает")
                         continue
-                    task = asyncio.create_task(self._run_task(item), name=key)
+                    item.triggered = False
+                    run, item.pending_run = item.pending_run, None
+                    task = asyncio.create_task(self._run_task(item, run), name=key)
                     self.tasks[key] = task
                     task.add_done_callback(self.handle_task_done)
 
-                    if item.interval > 0:
+                    if item.after:
+                        item.next_run = None
+                    elif item.interval > 0:
                         item.next_run = now + timedelta(seconds=item.interval)
                     else:
                         to_remove.append(key)
@@ -84,11 +276,29 @@ class EventLoop:
                 self.functions.pop(key, None)
                 # self.unregister(key)
             self.logger.info("end loop iter")
-            await asyncio.sleep(1)
+            await self._wait(self._next_timeout())
+
+    def _next_timeout(self) -> float:
+        """Время до ближайшего запуска, но не больше секунды."""
+        now = datetime.now()
+        timeout = 1.0
+        for key, item in self.functions.items():
+            if item.next_run is None or self._is_active(key):
+                continue
+            timeout = min(timeout, (item.next_run - now).total_seconds())
+        return max(timeout, 0)
+
+    async def _wait(self, timeout: float):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
         
 
     def stop(self):
         self.running = False
+        self._wakeup.set()
         for task in self.tasks.values():
             if not task.done():
                 task.cancel()
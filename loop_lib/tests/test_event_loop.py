@@ -1,7 +1,7 @@
 import pytest
 import asyncio
 from datetime import datetime
-from loop_lib.loop import EventLoopItem, EventLoop
+from loop_lib.loop import EventLoopItem, EventLoop, ScheduleHint, ScheduleHintError
 
 
 @pytest.mark.asyncio
@@ -108,3 +108,225 @@ async def test_error_handling(caplog):
     task.cancel()
 
     assert any("Ошибка выполнения функции fail" in msg for msg in caplog.messages)
+
+
+@pytest.mark.asyncio
+async def test_backoff_on_consecutive_failures():
+    """Интервал растёт экспоненциально при ошибках и ограничен max_interval"""
+    def fail_func():
+        raise ValueError("offline")
+
+    loop = EventLoop()
+    loop.register("poll", fail_func, interval=2, max_interval=5)
+    item = loop.functions["poll"]
+
+    intervals = []
+    for _ in range(3):
+        before = datetime.now()
+        await loop._run_task(item)
+        intervals.append(round((item.next_run - before).total_seconds()))
+
+    assert intervals == [4, 5, 5]
+    # уровень перестаёт расти, как только интервал достиг max_interval
+    assert item.backoff_level == 2
+
+
+def test_backoff_level_bounded():
+    """Длинная серия ошибок не переполняет backoff_factor ** backoff_level"""
+    def fail_func():
+        raise ValueError("offline")
+
+    loop = EventLoop()
+    loop.register("poll", fail_func, interval=1, max_interval=3600)
+    item = loop.functions["poll"]
+
+    for _ in range(2000):
+        loop._reschedule(item, datetime.now(), None, failed=True)
+
+    assert item.backoff_level == 12
+    assert item.backoff_interval() == 3600
+
+
+@pytest.mark.asyncio
+async def test_success_resets_backoff():
+    """Успешный запуск сбрасывает backoff"""
+    fail = True
+
+    def func():
+        if fail:
+            raise ValueError("offline")
+
+    loop = EventLoop()
+    loop.register("poll", func, interval=2, max_interval=60)
+    item = loop.functions["poll"]
+
+    await loop._run_task(item)
+    await loop._run_task(item)
+    assert item.backoff_level == 2
+
+    fail = False
+    await loop._run_task(item)
+    assert item.backoff_level == 0
+
+
+@pytest.mark.asyncio
+async def test_schedule_hints():
+    """Функция может вернуть или выбросить подсказку планировщику"""
+    hints = [ScheduleHint.after(30), ScheduleHint.sooner(), ScheduleHint.backoff()]
+
+    async def func():
+        hint = hints.pop(0)
+        if hint.type == "backoff":
+            raise ScheduleHintError(hint)
+        return hint
+
+    loop = EventLoop()
+    loop.register("poll", func, interval=10, max_interval=100)
+    item = loop.functions["poll"]
+
+    await loop._run_task(item)
+    assert 29 <= (item.next_run - datetime.now()).total_seconds() <= 30
+
+    await loop._run_task(item)
+    assert item.next_run <= datetime.now()
+
+    before = datetime.now()
+    await loop._run_task(item)
+    assert item.backoff_level == 1
+    assert round((item.next_run - before).total_seconds()) == 20
+
+
+@pytest.mark.asyncio
+async def test_trigger_runs_job_immediately():
+    """trigger() запускает функцию без ожидания интервала"""
+    counter = 0
+
+    async def inc():
+        nonlocal counter
+        counter += 1
+
+    loop = EventLoop()
+    loop.register("flush", inc, interval=100)
+    task = asyncio.create_task(loop.run())
+    await asyncio.sleep(0.1)
+    assert counter == 1
+
+    assert loop.trigger("flush") is True
+    await asyncio.sleep(0.1)
+    assert counter == 2
+
+    assert loop.trigger("unknown") is False
+    loop.stop()
+    task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_trigger_coalesces_while_running():
+    """Несколько trigger() во время выполнения объединяются в один запуск"""
+    counter = 0
+
+    async def slow():
+        nonlocal counter
+        counter += 1
+        await asyncio.sleep(0.2)
+
+    loop = EventLoop()
+    loop.register("flush", slow, interval=100)
+    task = asyncio.create_task(loop.run())
+    await asyncio.sleep(0.05)
+    for _ in range(3):
+        loop.trigger("flush")
+    await asyncio.sleep(0.6)
+
+    loop.stop()
+    task.cancel()
+    assert counter == 2
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runs_after_dependencies():
+    """Зависимая функция запускается после завершения всех зависимостей"""
+    events = []
+
+    def job(name, delay=0.0):
+        async def _run():
+            events.append(f"{name}:start")
+            await asyncio.sleep(delay)
+            events.append(f"{name}:end")
+        return _run
+
+    loop = EventLoop()
+    loop.register("poll", job("poll"), interval=100)
+    loop.register("aggregate", job("aggregate", 0.1), after=["poll"])
+    loop.register("stats", job("stats", 0.1), after=["poll"])
+    loop.register("publish", job("publish"), after=["aggregate", "stats"])
+
+    task = asyncio.create_task(loop.run())
+    await asyncio.sleep(0.4)
+    loop.stop()
+    task.cancel()
+
+    assert events.count("publish:end") == 1
+    assert events.index("poll:end") < events.index("aggregate:start")
+    # независимые ветки выполняются параллельно
+    assert events.index("stats:start") < events.index("aggregate:end")
+    assert events.index("publish:start") > max(events.index("aggregate:end"), events.index("stats:end"))
+    assert "publish" in loop.functions
+
+
+@pytest.mark.asyncio
+async def test_pipeline_fails_fast():
+    """Ошибка зависимости отменяет запуск всей цепочки ниже"""
+    called = []
+
+    def poll():
+        raise ValueError("offline")
+
+    loop = EventLoop()
+    loop.register("poll", poll, interval=100)
+    loop.register("aggregate", lambda: called.append("aggregate"), after=["poll"])
+    loop.register("publish", lambda: called.append("publish"), after=["aggregate"])
+
+    task = asyncio.create_task(loop.run())
+    await asyncio.sleep(0.2)
+    loop.stop()
+    task.cancel()
+
+    assert called == []
+
+
+def test_pipeline_does_not_mix_runs():
+    """Зависимая функция запускается только по завершениям одного прогона корня"""
+    loop = EventLoop()
+    loop.register("poll", lambda: None, interval=100)
+    loop.register("aggregate", lambda: None, after=["poll"])
+    loop.register("stats", lambda: None, after=["poll"])
+    loop.register("publish", lambda: None, after=["aggregate", "stats"])
+    publish = loop.functions["publish"]
+
+    # aggregate из прогона 1 и stats из прогона 2 не складываются в запуск
+    loop._notify_dependents("aggregate", True, {"poll": 1})
+    loop._notify_dependents("stats", True, {"poll": 2})
+    assert not publish.triggered
+    assert publish.completed == {"stats": {"poll": 2}}
+
+    # поздно пришедшее завершение старого прогона отбрасывается
+    loop._notify_dependents("aggregate", True, {"poll": 1})
+    assert not publish.triggered
+
+    # ошибка в прогоне 2 сбрасывает его завершения
+    loop._notify_dependents("aggregate", False, {"poll": 2})
+    assert publish.completed == {}
+
+    loop._notify_dependents("stats", True, {"poll": 3})
+    loop._notify_dependents("aggregate", True, {"poll": 3})
+    assert publish.triggered
+    assert publish.pending_run == {"poll": 3}
+
+
+def test_register_dependency_cycle():
+    loop = EventLoop()
+    loop.register("a", lambda: None, after=["c"])
+    loop.register("b", lambda: None, after=["a"])
+    with pytest.raises(ValueError, match="Циклическая зависимость"):
+        loop.register("c", lambda: None, after=["b"])
@@ -0,0 +1,49 @@
+"""
+Замер скорости постановки в очередь UniversalQueue.
+
+    python -m benchmarks.enqueue [число элементов]
+"""
+import logging, sys, time
+from queue_lib import UniversalQueue, QueueItem
+
+
+class Command(QueueItem):
+    type: str = "command"
+    device: str
+    value: int
+
+
+async def handler(item: Command):
+    pass
+
+
+def measure(name: str, count: int, fill) -> None:
+    queue = UniversalQueue({"command": (Command, handler)})
+    start = time.perf_counter()
+    fill(queue)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {count / elapsed:>12,.0f} items/s")
+
+
+def main(count: int) -> None:
+    logging.basicConfig(level=logging.WARNING)
+    data = [{"device": f"lamp-{i % 100}", "value": i} for i in range(count)]
+
+    def add(queue):
+        for kwargs in data:
+            queue.add("command", **kwargs)
+    measure("add", count, add)
+
+    if hasattr(UniversalQueue, "add_many"):
+        measure("add_many", count, lambda queue: queue.add_many("command", data))
+        items = [Command(**kwargs) for kwargs in data]
+        measure("add_many (prebuilt items)", count, lambda queue: queue.add_many("command", items))
+
+        def add_item(queue):
+            for item in items:
+                queue.add_item(item)
+        measure("add_item (prebuilt item)", count, add_item)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
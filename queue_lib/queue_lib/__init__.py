@@ -1 +1,6 @@
-from .universal_queue import UniversalQueue, QueueItem
\ No newline at end of file
+from .universal_queue import UniversalQueue, QueueItem
+from .types import RetryPolicy, DeadLetter, BatchOptions, MergePolicy, OverflowPolicy, QueueFullError, Executor
+from .ready_queue import ReadyQueue, DelayedQueue
+from .storage import SQLiteStorage
+from .metrics import QueueMetrics, MetricsSink, TypeStats
+from .transport import Transport, LoopbackTransport, RabbitMQTransport
@@ -0,0 +1,144 @@
+# metrics.py
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, Optional, Tuple
+from pydantic import BaseModel
+from .types import QueueItem
+
+# верхние границы корзин гистограммы задержек обработчиков, секунды
+LATENCY_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, float("inf"))
+
+
+class MetricsSink:
+    """
+    Приёмник метрик (Prometheus, StatsD и т.п.). Переопределите нужные методы.
+    increment: enqueued, processed, failed, retried, dropped.<причина>;
+    observe: wait_time, handler_latency (секунды).
+    """
+    def increment(self, name: str, type_name: str, value: int = 1) -> None:
+        pass
+
+    def observe(self, name: str, type_name: str, value: float) -> None:
+        pass
+
+
+class TypeStats(BaseModel):
+    depth: int = 0
+    enqueued: int = 0
+    enqueue_rate: float = 0  # элементов в секунду с предыдущего вызова stats()
+    processed: int = 0
+    failed: int = 0
+    retried: int = 0
+    dropped: Dict[str, int] = {}
+    wait_time_avg: float = 0
+    wait_time_max: float = 0
+    latency_avg: float = 0
+    latency_max: float = 0
+    latency_buckets: Dict[str, int] = {}  # верхняя граница корзины -> число вызовов
+
+
+class _Counters:
+    __slots__ = (
+        "enqueued", "processed", "failed", "retried", "dropped",
+        "wait_sum", "wait_count", "wait_max", "latency_sum", "latency_max", "buckets", "rate_base",
+    )
+
+    def __init__(self):
+        self.enqueued = self.processed = self.failed = self.retried = 0
+        self.dropped: Dict[str, int] = {}
+        self.wait_sum = self.wait_max = self.latency_sum = self.latency_max = 0.0
+        self.wait_count = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.rate_base = 0
+
+
+class QueueMetrics:
+    """Счётчики UniversalQueue по типам. Очередь без metrics не тратит на них ничего, кроме проверки на None."""
+    def __init__(self, sink: Optional[MetricsSink] = None):
+        self.sink = sink
+        self._types: Dict[str, _Counters] = {}
+        self._enqueued_at: Dict[int, float] = {}  # id элемента -> момент постановки в очередь
+        self._snapshot_at = time.monotonic()
+
+    def _counters(self, type_name: str) -> _Counters:
+        counters = self._types.get(type_name)
+        if counters is None:
+            counters = self._types[type_name] = _Counters()
+        return counters
+
+    def enqueued(self, item: QueueItem) -> None:
+        self._counters(item.type).enqueued += 1
+        self._enqueued_at[id(item)] = time.monotonic()
+        if self.sink is not None:
+            self.sink.increment("enqueued", item.type)
+
+    def started(self, items: Iterable[QueueItem]) -> None:
+        now = time.monotonic()
+        for item in items:
+            enqueued_at = self._enqueued_at.pop(id(item), None)
+            if enqueued_at is None:
+                continue
+            wait = now - enqueued_at
+            counters = self._counters(item.type)
+            counters.wait_sum += wait
+            counters.wait_count += 1
+            counters.wait_max = max(counters.wait_max, wait)
+            if self.sink is not None:
+                self.sink.observe("wait_time", item.type, wait)
+
+    def handled(self, type_name: str, latency: float) -> None:
+        counters = self._counters(type_name)
+        counters.latency_sum += latency
+        counters.latency_max = max(counters.latency_max, latency)
+        counters.buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        if self.sink is not None:
+            self.sink.observe("handler_latency", type_name, latency)
+
+    def completed(self, type_name: str, ok: bool, count: int = 1) -> None:
+        counters = self._counters(type_name)
+        if ok:
+            counters.processed += count
+        else:
+            counters.failed += count
+        if self.sink is not None:
+            self.sink.increment("processed" if ok else "failed", type_name, count)
+
+    def retried(self, item: QueueItem) -> None:
+        self._counters(item.type).retried += 1
+        self._enqueued_at[id(item)] = time.monotonic()
+        if self.sink is not None:
+            self.sink.increment("retried", item.type)
+
+    def dropped(self, item: QueueItem, reason: str) -> None:
+        dropped = self._counters(item.type).dropped
+        dropped[reason] = dropped.get(reason, 0) + 1
+        if self.sink is not None:
+            self.sink.increment(f"dropped.{reason}", item.type)
+
+    def finished(self, item: QueueItem) -> None:
+        self._enqueued_at.pop(id(item), None)
+
+    def snapshot(self, depths: Dict[str, int]) -> Dict[str, TypeStats]:
+        now = time.monotonic()
+        elapsed = max(now - self._snapshot_at, 1e-9)
+        self._snapshot_at = now
+        stats: Dict[str, TypeStats] = {}
+        for type_name in set(self._types) | set(depths):
+            counters = self._counters(type_name)
+            calls = sum(counters.buckets)
+            stats[type_name] = TypeStats(
+                depth=depths.get(type_name, 0),
+                enqueued=counters.enqueued,
+                enqueue_rate=(counters.enqueued - counters.rate_base) / elapsed,
+                processed=counters.processed,
+                failed=counters.failed,
+                retried=counters.retried,
+                dropped=dict(counters.dropped),
+                wait_time_avg=counters.wait_sum / counters.wait_count if counters.wait_count else 0,
+                wait_time_max=counters.wait_max,
+                latency_avg=counters.latency_sum / calls if calls else 0,
+                latency_max=counters.latency_max,
+                latency_buckets={str(bound): count for bound, count in zip(LATENCY_BUCKETS, counters.buckets)},
+            )
+            counters.rate_base = counters.enqueued
+        return stats
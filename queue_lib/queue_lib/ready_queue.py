@@ -0,0 +1,82 @@
+# ready_queue.py
+import heapq, time
+from itertools import count
+from typing import Callable, Iterator, List, Optional, Tuple
+from .types import QueueItem
+
+class ReadyQueue:
+    """
+    Очередь готовых к обработке элементов на куче.
+    Больший приоритет извлекается раньше, при равном приоритете сохраняется порядок добавления.
+    """
+    def __init__(self):
+        self._heap: List[Tuple[int, int, QueueItem]] = []
+        self._seq = count()
+
+    def push(self, item: QueueItem, priority: int = 0) -> None:
+        heapq.heappush(self._heap, (-priority, next(self._seq), item))
+
+    def pop(self) -> QueueItem:
+        return heapq.heappop(self._heap)[2]
+
+    def clear(self) -> None:
+        self._heap.clear()
+
+    def remove_oldest(self, predicate: Callable[[QueueItem], bool]) -> Optional[QueueItem]:
+        """Удаляет самый ранний добавленный элемент, подходящий под условие (O(n))."""
+        found = None
+        for index, entry in enumerate(self._heap):
+            if predicate(entry[2]) and (found is None or entry[1] < self._heap[found][1]):
+                found = index
+        if found is None:
+            return None
+        item = self._heap[found][2]
+        last = self._heap.pop()
+        if found < len(self._heap):
+            self._heap[found] = last
+            heapq.heapify(self._heap)
+        return item
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __iter__(self) -> Iterator[QueueItem]:
+        """Элементы в порядке извлечения (без изменения очереди)."""
+        return (entry[2] for entry in sorted(self._heap))
+
+    def __getitem__(self, index: int) -> QueueItem:
+        if index == 0 and self._heap:
+            return self._heap[0][2]
+        return sorted(self._heap)[index][2]
+
+    def __repr__(self) -> str:
+        return f"ReadyQueue({list(self)})"
+
+
+class DelayedQueue:
+    """Элементы, ожидающие повтора, упорядоченные по времени готовности (time.monotonic)."""
+    def __init__(self):
+        self._heap: List[Tuple[float, int, QueueItem]] = []
+        self._seq = count()
+
+    def push(self, item: QueueItem, delay: float) -> None:
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), item))
+
+    def pop_due(self) -> List[QueueItem]:
+        now = time.monotonic()
+        items = []
+        while self._heap and self._heap[0][0] <= now:
+            items.append(heapq.heappop(self._heap)[2])
+        return items
+
+    def next_delay(self) -> Optional[float]:
+        """Секунды до готовности ближайшего элемента или None, если очередь пуста."""
+        if not self._heap:
+            return None
+        return max(self._heap[0][0] - time.monotonic(), 0)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __iter__(self) -> Iterator[QueueItem]:
+        return (entry[2] for entry in sorted(self._heap))
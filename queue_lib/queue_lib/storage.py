@@ -0,0 +1,98 @@
+# storage.py
+import asyncio, sqlite3
+from pathlib import Path
+from typing import Dict, List, Tuple
+from .types import QueueItem
+
+class SQLiteStorage:
+    """
+    Постоянное хранилище элементов очереди в SQLite (WAL).
+    Добавления и удаления накапливаются и записываются одной транзакцией (group commit):
+    по достижении batch_size, по таймеру flush_interval или при явном flush().
+    Элемент, подтверждённый до записи, на диск не попадает вовсе.
+    """
+    def __init__(self, directory: str | Path, batch_size: int = 500, flush_interval: float = 0.05, file_name: str = "queue.sqlite3"):
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        self.path = path / file_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(self.path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")  # fsync на каждый commit — один на пачку
+        self._conn.execute("CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, type TEXT NOT NULL, data TEXT NOT NULL)")
+        self._next_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM items").fetchone()[0]
+        self._inserts: Dict[int, QueueItem] = {}
+        self._updates: Dict[int, QueueItem] = {}
+        self._deletes: List[int] = []
+        self._timer: asyncio.TimerHandle | None = None
+
+    def append(self, item: QueueItem) -> None:
+        item._storage_id = self._next_id
+        self._next_id += 1
+        self._inserts[item._storage_id] = item
+        self._schedule()
+
+    def update(self, item: QueueItem) -> None:
+        """Сохраняет изменённые поля элемента (например, try_start после неудачи)."""
+        if item._storage_id is None or item._storage_id in self._inserts:
+            return
+        self._updates[item._storage_id] = item
+        self._schedule()
+
+    def ack(self, item: QueueItem) -> None:
+        """Элемент обработан и больше не нужен."""
+        storage_id = item._storage_id
+        if storage_id is None:
+            return
+        item._storage_id = None
+        if self._inserts.pop(storage_id, None) is not None:
+            return
+        self._updates.pop(storage_id, None)
+        self._deletes.append(storage_id)
+        self._schedule()
+
+    def load(self, type_name: str) -> List[Tuple[int, str]]:
+        return self._conn.execute("SELECT id, data FROM items WHERE type = ? ORDER BY id", (type_name,)).fetchall()
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not (self._inserts or self._updates or self._deletes):
+            return
+        with self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT INTO items (id, type, data) VALUES (?, ?, ?)",
+                [(storage_id, item.type, item.model_dump_json()) for storage_id, item in self._inserts.items()],
+            )
+            self._conn.executemany(
+                "UPDATE items SET data = ? WHERE id = ?",
+                [(item.model_dump_json(), storage_id) for storage_id, item in self._updates.items()],
+            )
+            self._conn.executemany("DELETE FROM items WHERE id = ?", [(storage_id,) for storage_id in self._deletes])
+        self._inserts.clear()
+        self._updates.clear()
+        self._deletes.clear()
+
+    def compact(self) -> None:
+        """Записывает накопленное и переносит WAL в основной файл, освобождая место удалённых элементов."""
+        self.flush()
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        self.compact()
+        self._conn.close()
+
+    def _schedule(self) -> None:
+        if len(self._inserts) + len(self._updates) + len(self._deletes) >= self.batch_size:
+            self.flush()
+            return
+        if self._timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # вне event loop запись произойдёт по размеру пачки или при flush()
+        self._timer = loop.call_later(self.flush_interval, self.flush)
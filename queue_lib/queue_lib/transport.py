@@ -0,0 +1,208 @@
+# transport.py
+import asyncio, json, logging, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from threading import BoundedSemaphore, Thread
+from typing import Any, Callable, Dict, List, Optional
+from .types import QueueFullError
+
+Message = Dict[str, Any]  # элемент очереди в виде item.model_dump(mode="json")
+Deliver = Callable[..., None]  # deliver(message, ack=None, nack=None)
+
+
+class Transport:
+    """
+    Транспорт UniversalQueue между узлами: add() на любом узле публикует элемент,
+    а run() на узлах-обработчиках получает элементы и ставит их в локальную очередь.
+    """
+    def publish(self, message: Message) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, deliver: Deliver) -> None:
+        """
+        Начинает доставку входящих элементов в deliver (вызывается в цикле событий очереди).
+        Транспорт с подтверждениями передаёт вместе с сообщением ack() и nack(requeue).
+        """
+        raise NotImplementedError
+
+    def unsubscribe(self, deliver: Deliver) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class LoopbackTransport(Transport):
+    """
+    Транспорт в памяти процесса для тестов: элементы раздаются подписчикам по кругу,
+    до появления подписчиков копятся в backlog.
+    """
+    def __init__(self):
+        self.backlog: List[Message] = []
+        self._subscribers: List[Deliver] = []
+        self._next = 0
+
+    def publish(self, message: Message) -> None:
+        if not self._subscribers:
+            self.backlog.append(message)
+            return
+        deliver = self._subscribers[self._next % len(self._subscribers)]
+        self._next += 1
+        deliver(message)
+
+    def subscribe(self, deliver: Deliver) -> None:
+        self._subscribers.append(deliver)
+        backlog, self.backlog = self.backlog, []
+        for message in backlog:
+            self.publish(message)
+
+    def unsubscribe(self, deliver: Deliver) -> None:
+        if deliver in self._subscribers:
+            self._subscribers.remove(deliver)
+
+
+class RabbitMQTransport(Transport):
+    """
+    Транспорт через очередь RabbitMQ.
+    publish() не блокирует цикл событий: сообщения отправляет RabbitMQProducer из пакета rabitmq
+    в отдельном потоке, в буфере ждут не больше max_buffer сообщений.
+    Каждый подписчик — поток-консьюмер с ручным подтверждением: сообщение подтверждается, когда элемент
+    покинул локальную очередь, а не принятое очередью возвращается брокеру.
+    Одновременно у подписчика не больше prefetch_count неподтверждённых сообщений.
+    """
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 5672,
+        queue_name: str = "universal_queue",
+        prefetch_count: int = 100,
+        max_buffer: int = 10000,
+        logger: Any = None,
+    ):
+        self.host = host
+        self.port = port
+        self.queue_name = queue_name
+        self.prefetch_count = prefetch_count
+        self.logger = logger or logging.getLogger(__name__)
+        self._producer = None
+        self._publisher: Optional[ThreadPoolExecutor] = None
+        self._buffer = BoundedSemaphore(max_buffer)
+        self._consumers: Dict[Deliver, "_Subscriber"] = {}
+
+    def publish(self, message: Message) -> None:
+        """Передаёт сообщение потоку отправки; при заполненном буфере выбрасывает QueueFullError."""
+        if self._publisher is None:
+            from rabitmq import RabbitMQProducer
+            self._producer = RabbitMQProducer(host=self.host, port=self.port, queue_name=self.queue_name, logger=self.logger)
+            # соединение producer не потокобезопасно, поэтому поток отправки один
+            self._publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rabbitmq-transport")
+        if not self._buffer.acquire(blocking=False):
+            raise QueueFullError(f"Transport buffer is full: cannot publish item of type '{message.get('type')}'")
+        self._publisher.submit(self._producer.publish, message).add_done_callback(self._published)
+
+    def _published(self, future: Future) -> None:
+        self._buffer.release()
+        if not future.cancelled() and future.exception() is not None:
+            self.logger.error("[Transport] Failed to publish item: %s", future.exception())
+
+    def subscribe(self, deliver: Deliver) -> None:
+        subscriber = _Subscriber(self, deliver, asyncio.get_running_loop())
+        subscriber.start()
+        self._consumers[deliver] = subscriber
+
+    def unsubscribe(self, deliver: Deliver) -> None:
+        subscriber: Optional[_Subscriber] = self._consumers.pop(deliver, None)
+        if subscriber is not None:
+            # неподтверждённые сообщения брокер доставит заново после закрытия соединения
+            subscriber.stop()
+
+    def close(self) -> None:
+        for deliver in list(self._consumers):
+            self.unsubscribe(deliver)
+        if self._publisher is not None:
+            self._publisher.submit(self._producer.close)
+            self._publisher.shutdown(wait=True)
+            self._publisher = None
+            self._producer = None
+
+
+class _Subscriber(Thread):
+    """
+    Поток-консьюмер подписчика RabbitMQTransport: читает очередь без auto_ack и передаёт сообщения
+    в цикл событий очереди. Подтверждения выполняются в этом же потоке через add_callback_threadsafe.
+    """
+    def __init__(self, transport: RabbitMQTransport, deliver: Deliver, loop: asyncio.AbstractEventLoop):
+        super().__init__(daemon=True)
+        self.transport = transport
+        self.deliver = deliver
+        self.loop = loop
+        self.logger = transport.logger
+        self._is_interrupted = False
+
+    def stop(self) -> None:
+        # соединение закрывает сам поток: BlockingConnection нельзя трогать из других потоков
+        self._is_interrupted = True
+
+    def run(self) -> None:
+        import pika
+        transport = self.transport
+        while not self._is_interrupted:
+            connection = None
+            try:
+                params = pika.ConnectionParameters(host=transport.host, port=transport.port, heartbeat=300, blocked_connection_timeout=30)
+                connection = pika.BlockingConnection(params)
+                channel = connection.channel()
+                channel.queue_declare(queue=transport.queue_name)
+                channel.basic_qos(prefetch_count=transport.prefetch_count)
+                self.logger.info(f"[Transport] Consuming queue '{transport.queue_name}' on {transport.host}:{transport.port}")
+                for method, properties, body in channel.consume(transport.queue_name, inactivity_timeout=1, auto_ack=False):
+                    if self._is_interrupted:
+                        break
+                    if method is not None:
+                        self._on_message(connection, channel, method.delivery_tag, body)
+            except Exception as e:
+                self.logger.error(f"[Transport] RabbitMQ consumer error: {e}")
+                if not self._is_interrupted:
+                    time.sleep(5)
+            finally:
+                if connection is not None and connection.is_open:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+    def _on_message(self, connection: Any, channel: Any, delivery_tag: int, body: bytes) -> None:
+        try:
+            data = json.loads(body)
+        except Exception:
+            self.logger.exception("[Transport] Invalid JSON in message")
+            channel.basic_nack(delivery_tag, requeue=False)
+            return
+
+        def ack() -> None:
+            self._threadsafe(connection, partial(self._settle, channel, delivery_tag, None))
+
+        def nack(requeue: bool) -> None:
+            self._threadsafe(connection, partial(self._settle, channel, delivery_tag, requeue))
+
+        try:
+            self.loop.call_soon_threadsafe(self.deliver, data, ack, nack)
+        except RuntimeError:
+            # цикл очереди уже закрыт
+            channel.basic_nack(delivery_tag, requeue=True)
+
+    def _threadsafe(self, connection: Any, callback: Callable[[], None]) -> None:
+        try:
+            connection.add_callback_threadsafe(callback)
+        except Exception as e:
+            # соединение закрыто: брокер уже вернул сообщение в очередь
+            self.logger.warning(f"[Transport] Cannot settle message: {e}")
+
+    @staticmethod
+    def _settle(channel: Any, delivery_tag: int, requeue: Optional[bool]) -> None:
+        if not channel.is_open:
+            return
+        if requeue is None:
+            channel.basic_ack(delivery_tag)
+        else:
+            channel.basic_nack(delivery_tag, requeue=requeue)
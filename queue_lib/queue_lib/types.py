@@ -1,11 +1,68 @@
 # types.py
 
+import random
+from datetime import datetime
+from enum import Enum
 from pydantic import BaseModel
-from typing import Optional
+from typing import Any, Optional
 
 class QueueItem(BaseModel):
     type: str
     try_start: Optional[int] = 1
+    priority: Optional[int] = None  # None — приоритет типа, заданный при register
+    deadline: Optional[datetime] = None  # после дедлайна элемент удаляется без вызова обработчика
+    _attempts: int = 0  # число неудачных запусков
+    _last_error: Optional[str] = None
+    _storage_id: Optional[int] = None  # id записи в постоянном хранилище
+    _coalesce_key: Any = None  # ключ объединения, пока элемент ожидает обработки
 
     class Config:
         use_enum_values = True
+
+
+class RetryPolicy(BaseModel):
+    """Политика повторов типа: задержка растёт экспоненциально от delay до max_delay."""
+    delay: float = 0  # секунды до первого повтора, 0 — повтор на следующем проходе
+    factor: float = 2.0
+    max_delay: float = 300
+    jitter: float = 0.1  # доля случайного разброса задержки
+
+    def next_delay(self, attempt: int) -> float:
+        if self.delay <= 0:
+            return 0
+        delay = min(self.delay * self.factor ** max(attempt - 1, 0), self.max_delay)
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class DeadLetter(BaseModel):
+    """Элемент, исчерпавший все попытки."""
+    item: QueueItem
+    error: Optional[str] = None
+    failed_at: datetime
+
+
+class BatchOptions(BaseModel):
+    """Параметры пакетного обработчика: не больше max_batch элементов, ожидание не дольше max_wait_ms."""
+    max_batch: int = 100
+    max_wait_ms: float = 50
+
+
+class MergePolicy(str, Enum):
+    LATEST = "latest"  # данные нового элемента заменяют ожидающий
+    FIRST = "first"  # новый элемент отбрасывается
+
+
+class OverflowPolicy(str, Enum):
+    REJECT = "reject"  # add() выбрасывает QueueFullError
+    DROP_OLDEST = "drop_oldest"  # удаляется самый старый ожидающий элемент; если ожидающих нет — как DROP_NEWEST
+    DROP_NEWEST = "drop_newest"  # новый элемент отбрасывается
+
+
+class Executor(str, Enum):
+    ASYNC = "async"  # корутина в цикле событий
+    THREAD = "thread"  # синхронный обработчик в пуле потоков очереди
+    PROCESS = "process"  # синхронный обработчик в пуле процессов (обработчик и элементы должны сериализоваться pickle)
+
+
+class QueueFullError(Exception):
+    pass
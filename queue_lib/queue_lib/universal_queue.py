@@ -1,83 +1,895 @@
 # universal_queue.py
-from typing import List, Dict, Type, Callable, Awaitable, Optional, Any
-import asyncio, logging
+from typing import List, Dict, Deque, Set, Tuple, Type, Callable, Awaitable, Optional, Any, Sequence, Hashable, Union, Iterable, Mapping
+from collections import deque
+from datetime import datetime
+import asyncio, logging, os, time
+from concurrent.futures import Executor as PoolExecutor, ProcessPoolExecutor, ThreadPoolExecutor
 from contextlib import suppress
-from .types import QueueItem
+from pydantic import TypeAdapter
+from .types import QueueItem, RetryPolicy, DeadLetter, BatchOptions, MergePolicy, OverflowPolicy, QueueFullError, Executor
+from .ready_queue import ReadyQueue, DelayedQueue
+from .storage import SQLiteStorage
+from .metrics import QueueMetrics, TypeStats
+from .transport import Transport, Message
 
 class UniversalQueue:
-    def __init__(self, registrations=None, logger: Any | None = None):
-        self.queue: List[QueueItem] = []
-        self.pending: List[QueueItem] = []  # буфер для новых элементов
+    def __init__(
+        self,
+        registrations=None,
+        logger: Any | None = None,
+        workers: int = 1,
+        dead_letter_size: int = 1000,
+        storage: Optional[SQLiteStorage] = None,
+        max_size: Optional[int] = None,
+        overflow: OverflowPolicy = OverflowPolicy.REJECT,
+        high_watermark: Optional[int] = None,
+        low_watermark: Optional[int] = None,
+        on_high_watermark: Optional[Callable[["UniversalQueue"], None]] = None,
+        on_low_watermark: Optional[Callable[["UniversalQueue"], None]] = None,
+        metrics: Optional[QueueMetrics] = None,
+        pool_workers: Optional[int] = None,
+        pool_max_inflight: Optional[int] = None,
+        transport: Optional[Transport] = None,
+    ):
+        """
+        :param workers: число одновременно обрабатываемых элементов в start() и число воркеров в run()
+        :param dead_letter_size: сколько последних исчерпавших попытки элементов хранить в dead_letters
+        :param storage: постоянное хранилище; элементы восстанавливаются из него при регистрации типа
+        :param max_size: максимум элементов в очереди (включая ожидающие повтора и обрабатываемые)
+        :param overflow: что делать в add() при переполнении; put() вместо этого ждёт места
+        :param high_watermark: при достижении этого размера вызывается on_high_watermark(queue)
+        :param low_watermark: после high_watermark при снижении до этого размера вызывается on_low_watermark(queue)
+            (по умолчанию — половина high_watermark)
+        :param metrics: сбор статистики по типам для stats() и MetricsSink (по умолчанию выключен)
+        :param pool_workers: размер пулов потоков и процессов для обработчиков с executor THREAD/PROCESS
+            (по умолчанию — как в concurrent.futures)
+        :param pool_max_inflight: максимум задач, одновременно отправленных в каждый пул
+            (по умолчанию — удвоенный pool_workers или число ядер)
+        :param transport: распределённый режим: add() публикует элементы в транспорт,
+            а run() получает их из транспорта и обрабатывает локально (схемы и повторы — как без транспорта)
+        """
+        self.queue = ReadyQueue()
+        self.pending: Deque[QueueItem] = deque()  # буфер для новых элементов
+        self.delayed = DelayedQueue()  # элементы, ожидающие повтора
+        self.dead_letters: Deque[DeadLetter] = deque(maxlen=dead_letter_size)
         self.handlers: Dict[str, Callable[[QueueItem], Awaitable[None]]] = {}
         self.schemas: Dict[str, Type[QueueItem]] = {}
+        self.limits: Dict[str, asyncio.Semaphore] = {}  # ограничение параллельности по типам
+        self.priorities: Dict[str, int] = {}  # приоритет по умолчанию для типов
+        self.retry_policies: Dict[str, RetryPolicy] = {}
+        self.batch_options: Dict[str, BatchOptions] = {}  # типы с пакетными обработчиками
+        self._batches: Dict[str, List[QueueItem]] = {}  # накопление пачек в run()
+        self._batch_started: Dict[str, float] = {}
+        self.coalesce_keys: Dict[str, Callable[[QueueItem], Hashable]] = {}
+        self.merge_policies: Dict[str, Union[MergePolicy, Callable[[QueueItem, QueueItem], QueueItem]]] = {}
+        self._coalesce_index: Dict[Tuple[str, Hashable], QueueItem] = {}  # ожидающие элементы по ключу объединения
+        self._adapters: Dict[str, TypeAdapter] = {}  # валидаторы списков для add_many
+        self.partition_keys: Dict[str, Callable[[QueueItem], Hashable]] = {}
+        self._owners: Dict[Hashable, QueueItem] = {}  # партиция -> элемент, который сейчас её занимает
+        self._lanes: Dict[Hashable, Deque[QueueItem]] = {}  # элементы, ждущие освобождения партиции
+        self._held: Dict[str, Deque[QueueItem]] = {}  # элементы типов, чей лимит параллельности занят (run())
+        self.workers = max(1, workers)
         self.logger = logger or logging.getLogger(__name__)
         self._lock = asyncio.Lock()  # защита от одновременного add + start
+        self._wakeup = asyncio.Event()  # будит воркеров run() при добавлении элемента
+        self._tasks: List[asyncio.Task] = []
+        self.running = False
+        self.storage = storage
+        self.metrics = metrics
+        self.transport = transport
+        self._acks: Dict[int, List[Callable[[], None]]] = {}  # id(элемента) -> подтверждения сообщений транспорта
+        self.max_size = max_size
+        self.overflow = overflow
+        self.max_sizes: Dict[str, int] = {}
+        self.overflow_policies: Dict[str, OverflowPolicy] = {}
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark if low_watermark is not None else (high_watermark or 0) // 2
+        self.on_high_watermark = on_high_watermark
+        self.on_low_watermark = on_low_watermark
+        self._size = 0
+        self._type_sizes: Dict[str, int] = {}
+        self._above_high = False
+        self._space = asyncio.Event()  # будит put() при освобождении места
+        self._recovered: Set[str] = set()
+        self.pool_workers = pool_workers
+        self.pool_max_inflight = pool_max_inflight
+        self._pools: Dict[Executor, PoolExecutor] = {}  # создаются при первом вызове обработчика
+        self._pool_slots: Dict[Executor, asyncio.Semaphore] = {}
 
         if registrations:
             for type_name, (schema, handler) in registrations.items():
                 self.register(type_name, schema, handler)
 
-    def register(self, type_name: str, schema: Type[QueueItem], handler: Callable[[QueueItem], Awaitable[None]]):
+    def register(
+        self,
+        type_name: str,
+        schema: Type[QueueItem],
+        handler: Callable[[QueueItem], Awaitable[None]],
+        concurrency: Optional[int] = None,
+        priority: int = 0,
+        retry: Optional[RetryPolicy] = None,
+        coalesce_key: Optional[Callable[[QueueItem], Hashable]] = None,
+        merge: Union[MergePolicy, Callable[[QueueItem, QueueItem], QueueItem]] = MergePolicy.LATEST,
+        max_size: Optional[int] = None,
+        overflow: Optional[OverflowPolicy] = None,
+        partition_key: Optional[Callable[[QueueItem], Hashable]] = None,
+        executor: Executor = Executor.ASYNC,
+    ):
+        """
+        :param concurrency: максимум одновременно выполняемых обработчиков этого типа (None — без ограничения)
+        :param priority: приоритет элементов типа, если он не указан в самом элементе (больше — раньше)
+        :param retry: задержки между повторами (по умолчанию — повтор на следующем проходе без задержки)
+        :param coalesce_key: функция ключа объединения; новый элемент с ключом уже ожидающего элемента
+            не добавляется в очередь, а объединяется с ним по политике merge
+        :param merge: MergePolicy или функция (ожидающий, новый) -> объединённый элемент
+        :param max_size: максимум элементов этого типа в очереди
+        :param overflow: политика переполнения для типа (по умолчанию — политика очереди)
+        :param partition_key: функция ключа партиции; элементы с одинаковым ключом (в том числе разных типов)
+            обрабатываются строго по очереди, разные ключи — параллельно в пределах workers.
+            Повтор элемента блокирует только его партицию
+        :param executor: THREAD или PROCESS — handler синхронный и выполняется в пуле очереди,
+            его результат и исключения обрабатываются так же, как у корутины
+        """
         self.schemas[type_name] = schema
-        self.handlers[type_name] = handler
+        self.handlers[type_name] = handler if executor == Executor.ASYNC else self._offload(handler, executor)
+        self._adapters.pop(type_name, None)
+        self.priorities[type_name] = priority
+        self.retry_policies[type_name] = retry or RetryPolicy()
+        self.batch_options.pop(type_name, None)
+        if max_size is not None:
+            self.max_sizes[type_name] = max_size
+        else:
+            self.max_sizes.pop(type_name, None)
+        if overflow is not None:
+            self.overflow_policies[type_name] = overflow
+        else:
+            self.overflow_policies.pop(type_name, None)
+        if partition_key is not None:
+            self.partition_keys[type_name] = partition_key
+        else:
+            self.partition_keys.pop(type_name, None)
+        if coalesce_key is not None:
+            self.coalesce_keys[type_name] = coalesce_key
+            self.merge_policies[type_name] = merge
+        else:
+            self.coalesce_keys.pop(type_name, None)
+            self.merge_policies.pop(type_name, None)
+        if concurrency:
+            self.limits[type_name] = asyncio.Semaphore(concurrency)
+        else:
+            self.limits.pop(type_name, None)
         self.logger.info(f"[Queue] Registered queue type '{type_name}' with model {schema.__name__}")
+        if self.storage is not None and type_name not in self._recovered:
+            self._recover(type_name, schema)
+
+    def _offload(self, handler: Callable[[Any], Any], executor: Executor) -> Callable[[Any], Awaitable[Any]]:
+        async def run(argument: Any) -> Any:
+            pool, slots = self._pool(executor)
+            async with slots:
+                return await asyncio.get_running_loop().run_in_executor(pool, handler, argument)
+        return run
+
+    def _pool(self, executor: Executor) -> Tuple[PoolExecutor, asyncio.Semaphore]:
+        pool = self._pools.get(executor)
+        if pool is None:
+            if executor == Executor.PROCESS:
+                pool = ProcessPoolExecutor(max_workers=self.pool_workers)
+            else:
+                pool = ThreadPoolExecutor(max_workers=self.pool_workers, thread_name_prefix="queue")
+            self._pools[executor] = pool
+            limit = self.pool_max_inflight or 2 * (self.pool_workers or os.cpu_count() or 1)
+            self._pool_slots[executor] = asyncio.Semaphore(limit)
+        return pool, self._pool_slots[executor]
+
+    def register_batch(
+        self,
+        type_name: str,
+        schema: Type[QueueItem],
+        handler: Callable[[List[QueueItem]], Awaitable[Optional[Sequence[Any]]]],
+        max_batch: int = 100,
+        max_wait_ms: float = 50,
+        **kwargs,
+    ):
+        """
+        Регистрирует пакетный обработчик: он получает список до max_batch элементов одного типа
+        (в run() — всё, что накопилось за max_wait_ms).
+        Обработчик возвращает None, если все элементы обработаны, либо список результатов по элементам:
+        True/None — успех, False или исключение — ошибка (для таких элементов работают повторы).
+        Остальные параметры как у register(), кроме partition_key.
+        """
+        if kwargs.get("partition_key") is not None:
+            raise ValueError("Batch handlers do not support partition_key")
+        self.register(type_name, schema, handler, **kwargs)
+        self.batch_options[type_name] = BatchOptions(max_batch=max(1, max_batch), max_wait_ms=max_wait_ms)
+
+    def _recover(self, type_name: str, schema: Type[QueueItem]) -> None:
+        self._recovered.add(type_name)
+        rows = self.storage.load(type_name)
+        for storage_id, data in rows:
+            item = schema.model_validate_json(data)
+            item._storage_id = storage_id
+            self.pending.append(item)
+            self._accepted(item)
+        if rows:
+            self._wakeup.set()
+            self.logger.info(f"[Queue] Recovered {len(rows)} items of type '{type_name}' from storage")
 
     def add(self, type_name: str, **kwargs) -> None:
         try:
-            self.logger.debug(f"[Queue] Adding item. Type: {type_name}, Data: {kwargs}")
-            schema = self.schemas.get(type_name)
-            if not schema:
-                raise ValueError(f"Unknown queue type: {type_name}")
-            item = schema(**kwargs)
-            self.pending.append(item)  # добавляем в буфер
-            self.logger.info(f"[Queue] Item added to pending: {item}")
+            self.logger.debug("[Queue] Adding item. Type: %s, Data: %s", type_name, kwargs)
+            item = self._schema(type_name)(**kwargs)
+            self._enqueue(item)
+            self._wakeup.set()
+        except Exception as e:
+            self.logger.error("[Queue] Failed to add item: %s", e, exc_info=True)
+            raise
+
+    def add_item(self, item: QueueItem) -> None:
+        """Быстрый путь: добавляет уже созданный элемент без повторной валидации."""
+        self._schema(item.type)
+        self._enqueue(item)
+        self._wakeup.set()
+
+    def add_many(self, type_name: str, items: Iterable[Union[Mapping[str, Any], QueueItem]]) -> int:
+        """
+        Добавляет элементы одного типа, проверяя весь список за один вызов валидатора.
+        Уже созданные экземпляры схемы повторно не валидируются.
+        Возвращает число добавленных элементов (без объединённых и отброшенных).
+        """
+        schema = self._schema(type_name)
+        try:
+            adapter = self._adapters.get(type_name)
+            if adapter is None:
+                adapter = self._adapters[type_name] = TypeAdapter(List[schema])
+            models = adapter.validate_python(items if isinstance(items, list) else list(items))
         except Exception as e:
-            self.logger.error(f"[Queue] Failed to add item: {e}", exc_info=True)
+            self.logger.error("[Queue] Failed to add items of type '%s': %s", type_name, e, exc_info=True)
             raise
+        added = sum(1 for item in models if self._enqueue(item))
+        if added:
+            self._wakeup.set()
+        self.logger.debug("[Queue] Added %d of %d items of type '%s'", added, len(models), type_name)
+        return added
+
+    def _schema(self, type_name: str) -> Type[QueueItem]:
+        schema = self.schemas.get(type_name)
+        if not schema:
+            raise ValueError(f"Unknown queue type: {type_name}")
+        return schema
+
+    def _enqueue(self, item: QueueItem) -> bool:
+        if self.transport is not None:
+            self.transport.publish(item.model_dump(mode="json"))
+            self.logger.debug("[Queue] Item published to transport: %s", item)
+            return True
+        return self._enqueue_local(item)
+
+    def _enqueue_local(self, item: QueueItem) -> bool:
+        if item.type in self.coalesce_keys and self._coalesce(item):
+            return False
+        if not self._admit(item):
+            return False
+        if self.storage is not None:
+            self.storage.append(item)
+        self.pending.append(item)  # добавляем в буфер
+        self._accepted(item)
+        self.logger.debug("[Queue] Item added to pending: %s", item)
+        return True
+
+    def _receive(
+        self,
+        message: Message,
+        ack: Optional[Callable[[], None]] = None,
+        nack: Optional[Callable[[bool], None]] = None,
+    ) -> None:
+        """
+        Ставит элемент, полученный из транспорта, в локальную очередь.
+        ack() вызывается, когда элемент покинул очередь (обработан, просрочен, вытеснен или ушёл в dead letters);
+        nack(requeue) — если элемент не принят: requeue=False для невалидного сообщения, True при переполнении.
+        """
+        try:
+            item = self._schema(message.get("type")).model_validate(message)
+        except Exception as e:
+            self.logger.error("[Queue] Failed to accept item from transport: %s", e, exc_info=True)
+            if nack is not None:
+                nack(False)
+            return
+        if ack is not None:
+            self._acks[id(item)] = [ack]
+        try:
+            accepted = self._enqueue_local(item)
+        except QueueFullError as e:
+            self.logger.warning("[Queue] Item from transport rejected: %s", e)
+            accepted = False
+        # у объединённого элемента подтверждения уже нет — его передали поглотившему элементу
+        if not accepted and self._acks.pop(id(item), None) is not None and nack is not None:
+            nack(True)
+        self._wakeup.set()
+
+    async def put(self, type_name: str, **kwargs) -> None:
+        """Как add(), но при переполнении ждёт освобождения места вместо политики overflow."""
+        while self._is_full(type_name):
+            self._space.clear()
+            await self._space.wait()
+        self.add(type_name, **kwargs)
+
+    def size(self, type_name: Optional[str] = None) -> int:
+        """Число элементов в очереди (всех или одного типа), включая ожидающие повтора и обрабатываемые."""
+        if type_name is None:
+            return self._size
+        return self._type_sizes.get(type_name, 0)
+
+    def _type_full(self, type_name: str) -> bool:
+        limit = self.max_sizes.get(type_name)
+        return limit is not None and self._type_sizes.get(type_name, 0) >= limit
+
+    def _is_full(self, type_name: str) -> bool:
+        return (self.max_size is not None and self._size >= self.max_size) or self._type_full(type_name)
+
+    def _admit(self, item: QueueItem) -> bool:
+        """Применяет политику переполнения. Возвращает False, если новый элемент отброшен."""
+        if not self._is_full(item.type):
+            return True
+        policy = self.overflow_policies.get(item.type, self.overflow)
+        if policy == OverflowPolicy.DROP_OLDEST:
+            type_name = item.type if self._type_full(item.type) else None
+            victim = self._remove_oldest(type_name)
+            if victim is not None:
+                self.logger.warning(f"[Queue] Queue is full, oldest item of type '{victim.type}' dropped")
+                if self.metrics is not None:
+                    self.metrics.dropped(victim, "overflow")
+                self._release_key(victim)
+                self._finish(victim)
+                return True
+            # все элементы уже в обработке — вытеснять нечего, отбрасываем новый
+            policy = OverflowPolicy.DROP_NEWEST
+        if policy == OverflowPolicy.DROP_NEWEST:
+            self.logger.warning(f"[Queue] Queue is full, new item of type '{item.type}' dropped")
+            if self.metrics is not None:
+                self.metrics.dropped(item, "overflow")
+            return False
+        if self.metrics is not None:
+            self.metrics.dropped(item, "overflow")
+        raise QueueFullError(f"Queue is full: cannot add item of type '{item.type}'")
+
+    def _remove_oldest(self, type_name: Optional[str]) -> Optional[QueueItem]:
+        def matches(candidate: QueueItem) -> bool:
+            return type_name is None or candidate.type == type_name
+
+        victim = self.queue.remove_oldest(matches)
+        if victim is not None:
+            return victim
+        for candidate in self.pending:
+            if matches(candidate):
+                self.pending.remove(candidate)
+                return candidate
+        return None
+
+    def _accepted(self, item: QueueItem) -> None:
+        self._size += 1
+        self._type_sizes[item.type] = self._type_sizes.get(item.type, 0) + 1
+        if self.metrics is not None:
+            self.metrics.enqueued(item)
+        if self.high_watermark is not None and not self._above_high and self._size >= self.high_watermark:
+            self._above_high = True
+            self.logger.warning(f"[Queue] High watermark reached: {self._size} items")
+            if self.on_high_watermark:
+                self.on_high_watermark(self)
+
+    def _coalesce(self, item: QueueItem) -> bool:
+        """Объединяет элемент с ожидающим элементом того же ключа. Возвращает True, если элемент поглощён."""
+        key = (item.type, self.coalesce_keys[item.type](item))
+        existing = self._coalesce_index.get(key)
+        if existing is None:
+            item._coalesce_key = key
+            self._coalesce_index[key] = item
+            return False
+        policy = self.merge_policies[item.type]
+        if policy != MergePolicy.FIRST:
+            merged = item if policy == MergePolicy.LATEST else policy(existing, item)
+            if merged is not existing:
+                # обновляем на месте: элемент сохраняет позицию в очереди
+                existing.__dict__.update(merged.__dict__)
+            if self.storage is not None:
+                self.storage.update(existing)
+        # сообщение транспорта подтверждается вместе с элементом, поглотившим его
+        acks = self._acks.pop(id(item), None)
+        if acks:
+            self._acks.setdefault(id(existing), []).extend(acks)
+        self.logger.debug("[Queue] Item of type '%s' coalesced with pending item %r", item.type, key[1])
+        return True
+
+    def _release_key(self, item: QueueItem) -> None:
+        key = item._coalesce_key
+        if key is None:
+            return
+        item._coalesce_key = None
+        if self._coalesce_index.get(key) is item:
+            del self._coalesce_index[key]
 
     async def start(self) -> bool:
         async with self._lock:
             # переносим pending в queue
-            self.queue.extend(self.pending)
-            self.pending.clear()
+            self._promote()
 
-            self.logger.debug(f"[Queue] Starting. Items: {self.queue} {self.pending}")
+            self.logger.debug("[Queue] Starting. Items: %s %s", self.queue, self.pending)
             self.logger.info(f"[Queue] Starting. Items: {len(self.queue)}")
             if not self.queue:
                 self.logger.info("[Queue] Queue is empty.")
                 return True
 
+            items = [item for item in self._drain() if not self._expired(item)]
+            units = self._units(items)
+            results: List[Optional[bool]] = [None] * len(items)
+            cancelled: Optional[asyncio.CancelledError] = None
+            try:
+                if self.workers > 1:
+                    await self._process_pool(items, units, results)
+                else:
+                    for unit in units:
+                        self._store_results(results, unit, await self._process_unit(items, unit))
+            except asyncio.CancelledError as e:
+                # учитываем завершённые элементы, незапущенные и прерванные возвращаем в очередь
+                cancelled = e
+
             success = True
             restart: List[QueueItem] = []
-
-            for idx, item in enumerate(list(self.queue)):
-                try:
-                    self.logger.debug(f"[Queue] Processing item {idx + 1}: {item}")
-                    handler = self.handlers.get(item.type)
-                    if not handler:
-                        raise ValueError(f"No handler registered for type: {item.type}")
-                    await handler(item)
-                except asyncio.CancelledError:
-                    self.logger.warning("[Queue] Processing cancelled.")
-                    success = False
-                    raise
-                except Exception as e:
-                    self.logger.error(f"[Queue] Error processing item {idx + 1}: {e}", exc_info=True)
-                    success = False
-                    if item.try_start > 1:
-                        item.try_start -= 1
+            # в порядке обработки, чтобы элементы партиции вставали в очередь за своим предшественником
+            for unit in units:
+                for idx in unit:
+                    item, ok = items[idx], results[idx]
+                    if ok:
+                        self._finish(item)
+                    elif ok is None and cancelled is not None:
                         restart.append(item)
-                    continue
+                    elif ok is None:
+                        # не запускался: партиция заблокирована повтором предыдущего элемента
+                        self._lanes.setdefault(self._partition(item), deque()).append(item)
+                    else:
+                        success = False
+                        if self._retry(item):
+                            restart.append(item)
 
             # сохраняем необработанные элементы и добавляем новые из pending
-            self.logger.debug(f"[Queue] end iter: {self.queue} {self.pending} {restart}")
+            self.logger.debug("[Queue] end iter: %s %s %s", self.queue, self.pending, restart)
 
-            self.queue = restart + self.pending
-            self.pending.clear()
-            self.logger.debug(f"[Queue] end clear : {self.queue} {self.pending} {restart}")
+            for item in restart:
+                self._push(item)
+            self._promote()
+            self.logger.debug("[Queue] end clear : %s %s %s", self.queue, self.pending, restart)
+            if cancelled is not None:
+                self.logger.warning(f"[Queue] Start cancelled. Remaining items: {len(self.queue)}")
+                raise cancelled
 
             if not self.queue:
                 self.logger.info("[Queue] Cleared successfully.")
 
-            self.logger.info(f"[Queue] Finished. Success: {success}. Remaining items: {len(self.queue)}")
+            self.logger.info(f"[Queue] Finished. Success: {success}. Remaining items: {len(self.queue)}. Delayed: {len(self.delayed)}")
             return success
+
+    async def run(self) -> None:
+        """
+        Непрерывный режим: воркеры ждут элементы и обрабатывают их сразу после add(),
+        без периодического вызова start(). Не используйте вместе с start().
+        """
+        self.running = True
+        self._wakeup.set()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self.logger.info(f"[Queue] Running with {self.workers} workers")
+        if self.transport is not None:
+            self.transport.subscribe(self._receive)
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            if self.transport is not None:
+                self.transport.unsubscribe(self._receive)
+            tasks, self._tasks = self._tasks, []
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            # ждём, пока отменённые воркеры вернут прерванные элементы
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.running = False
+            # недособранные пачки и отложенные по лимиту элементы возвращаются в очередь
+            for buffer in self._batches.values():
+                self.pending.extend(buffer)
+                buffer.clear()
+            for held in self._held.values():
+                self.pending.extend(held)
+                held.clear()
+            self.logger.info(f"[Queue] Stopped. Remaining items: {len(self.queue) + len(self.pending)}")
+
+    def stop(self) -> None:
+        """Останавливает run(): воркеры завершают текущий элемент, остальные остаются в очереди."""
+        self.running = False
+        self._wakeup.set()
+
+    def _priority(self, item: QueueItem) -> int:
+        if item.priority is not None:
+            return item.priority
+        return self.priorities.get(item.type, 0)
+
+    def _push(self, item: QueueItem) -> None:
+        self.queue.push(item, self._priority(item))
+
+    def _promote(self) -> None:
+        for item in self.delayed.pop_due():
+            self._push(item)
+        while self.pending:
+            self._push(self.pending.popleft())
+
+    def _finish(self, item: QueueItem) -> None:
+        """Элемент покинул очередь: обработан, просрочен, вытеснен или исчерпал попытки."""
+        if self.storage is not None:
+            self.storage.ack(item)
+        self._release_key(item)
+        for ack in self._acks.pop(id(item), ()):
+            ack()
+        self._size -= 1
+        self._type_sizes[item.type] -= 1
+        if self.metrics is not None:
+            self.metrics.finished(item)
+        self._space.set()
+        if self.partition_keys:
+            self._release(item)
+        if self._above_high and self._size <= self.low_watermark:
+            self._above_high = False
+            self.logger.info(f"[Queue] Low watermark reached: {self._size} items")
+            if self.on_low_watermark:
+                self.on_low_watermark(self)
+
+    def stats(self) -> Dict[str, TypeStats]:
+        """Снимок статистики по типам. Без metrics заполняется только depth."""
+        if self.metrics is None:
+            return {type_name: TypeStats(depth=depth) for type_name, depth in self._type_sizes.items()}
+        return self.metrics.snapshot(self._type_sizes)
+
+    def close(self) -> None:
+        """Записывает и закрывает постоянное хранилище, останавливает пулы обработчиков и транспорт."""
+        if self.storage is not None:
+            self.storage.close()
+        if self.transport is not None:
+            self.transport.close()
+        for pool in self._pools.values():
+            pool.shutdown()
+        self._pools.clear()
+        self._pool_slots.clear()
+
+    def _retry(self, item: QueueItem) -> bool:
+        """
+        Обрабатывает неудачный запуск. Возвращает True, если элемент нужно повторить сразу;
+        отложенные повторы уходят в delayed, исчерпавшие попытки — в dead_letters.
+        """
+        item._attempts += 1
+        if item.try_start > 1:
+            item.try_start -= 1
+            key = self._partition(item)
+            if key is not None:
+                self._owners[key] = item  # партиция ждёт повтора этого элемента
+            if self.storage is not None:
+                self.storage.update(item)
+            if self.metrics is not None:
+                self.metrics.retried(item)
+            delay = self.retry_policies.get(item.type, RetryPolicy()).next_delay(item._attempts)
+            if delay <= 0:
+                return True
+            self.delayed.push(item, delay)
+            self.logger.info(f"[Queue] Item of type '{item.type}' will be retried in {delay:.2f}s")
+            return False
+        self.dead_letters.append(DeadLetter(item=item, error=item._last_error, failed_at=datetime.now()))
+        if self.metrics is not None:
+            self.metrics.dropped(item, "dead_letter")
+        self._finish(item)
+        self.logger.warning(f"[Queue] Item of type '{item.type}' moved to dead letters after {item._attempts} attempts")
+        return False
+
+    def replay_dead_letters(self, type_name: Optional[str] = None, try_start: int = 1) -> int:
+        """Возвращает элементы из dead_letters (всех или одного типа) в очередь. Возвращает их число."""
+        remaining: Deque[DeadLetter] = deque(maxlen=self.dead_letters.maxlen)
+        replayed = 0
+        for letter in self.dead_letters:
+            if type_name is not None and letter.item.type != type_name:
+                remaining.append(letter)
+                continue
+            letter.item.try_start = try_start
+            letter.item._attempts = 0
+            if self.storage is not None:
+                self.storage.append(letter.item)
+            self.pending.append(letter.item)
+            self._accepted(letter.item)
+            replayed += 1
+        self.dead_letters = remaining
+        if replayed:
+            self._wakeup.set()
+        self.logger.info(f"[Queue] Replayed {replayed} dead letters")
+        return replayed
+
+    def _drain(self) -> List[QueueItem]:
+        items = []
+        while self.queue:
+            items.append(self.queue.pop())
+        return items
+
+    def _expired(self, item: QueueItem) -> bool:
+        if item.deadline is None or datetime.now(item.deadline.tzinfo) < item.deadline:
+            return False
+        self.logger.warning(f"[Queue] Item of type '{item.type}' expired at {item.deadline}, skipped")
+        if self.metrics is not None:
+            self.metrics.dropped(item, "expired")
+        self._finish(item)
+        return True
+
+    def _next_item(self) -> Optional[QueueItem]:
+        self._promote()
+        while self.queue:
+            item = self.queue.pop()
+            if not self._expired(item):
+                return item
+        return None
+
+    def _partition(self, item: QueueItem) -> Optional[Hashable]:
+        key_fn = self.partition_keys.get(item.type)
+        return None if key_fn is None else key_fn(item)
+
+    def _claim(self, item: QueueItem, key: Hashable) -> bool:
+        """Занимает партицию элементом. Если она занята другим элементом, элемент ставится за ним в очередь."""
+        owner = self._owners.get(key)
+        if owner is None or owner is item:
+            self._owners[key] = item
+            return True
+        self._lanes.setdefault(key, deque()).append(item)
+        return False
+
+    def _release(self, item: QueueItem) -> None:
+        """Освобождает партицию, которую занимал элемент, и делает готовым следующий элемент партиции."""
+        key = self._partition(item)
+        if key is None or self._owners.get(key) is not item:
+            return
+        lane = self._lanes.get(key)
+        if not lane:
+            del self._owners[key]
+            self._lanes.pop(key, None)
+            return
+        following = lane.popleft()
+        self._owners[key] = following
+        self._push(following)
+        self._wakeup.set()
+
+    def _limited(self, type_name: str) -> bool:
+        limit = self.limits.get(type_name)
+        return limit is not None and limit.locked()
+
+    def _next_unit(self) -> Optional[List[QueueItem]]:
+        while (item := self._next_item()) is not None:
+            if self._limited(item.type):
+                # лимит типа занят — откладываем элемент, чтобы воркер не простаивал на семафоре
+                self._held.setdefault(item.type, deque()).append(item)
+                continue
+            if item.type in self.partition_keys:
+                if not self._claim(item, self._partition(item)):
+                    continue
+                return [item]
+            options = self.batch_options.get(item.type)
+            if options is None:
+                return [item]
+            buffer = self._batches.setdefault(item.type, [])
+            if not buffer:
+                self._batch_started[item.type] = time.monotonic()
+            buffer.append(item)
+            if len(buffer) >= options.max_batch:
+                return self._take_batch(item.type)
+        # готовых элементов нет — отдаём пачки, ожидающие дольше max_wait_ms
+        now = time.monotonic()
+        for type_name, buffer in self._batches.items():
+            if buffer and now - self._batch_started[type_name] >= self.batch_options[type_name].max_wait_ms / 1000:
+                return self._take_batch(type_name)
+        return None
+
+    def _take_batch(self, type_name: str) -> List[QueueItem]:
+        batch = self._batches[type_name]
+        self._batches[type_name] = []
+        return batch
+
+    def _next_timeout(self) -> Optional[float]:
+        timeouts = [self.delayed.next_delay()]
+        now = time.monotonic()
+        for type_name, buffer in self._batches.items():
+            if buffer:
+                deadline = self._batch_started[type_name] + self.batch_options[type_name].max_wait_ms / 1000
+                timeouts.append(max(deadline - now, 0))
+        timeouts = [timeout for timeout in timeouts if timeout is not None]
+        return min(timeouts) if timeouts else None
+
+    async def _worker(self):
+        while self.running:
+            unit = self._next_unit()
+            if unit is None:
+                self._wakeup.clear()
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), self._next_timeout())
+                continue
+            try:
+                if unit[0].type in self.batch_options:
+                    results = await self._process_batch(unit)
+                else:
+                    results = [await self._process(unit[0])]
+            except asyncio.CancelledError:
+                # run() отменён во время обработки: элементы возвращаются в очередь, партиция остаётся за ними
+                self.pending.extend(unit)
+                raise
+            for item, ok in zip(unit, results):
+                if ok:
+                    self._finish(item)
+                elif self._retry(item):
+                    self.pending.append(item)
+
+    def _units(self, items: List[QueueItem]) -> List[List[int]]:
+        """
+        Разбивает проход start() на единицы обработки: одиночные элементы, пачки по max_batch
+        и цепочки элементов одной партиции. Элементы занятых партиций откладываются до их освобождения.
+        """
+        units: List[List[int]] = []
+        open_batches: Dict[str, List[int]] = {}
+        chains: Dict[Hashable, List[int]] = {}
+        for idx, item in list(enumerate(items)):
+            if item.type in self.partition_keys:
+                key = self._partition(item)
+                chain = chains.get(key)
+                if chain is not None:
+                    chain.append(idx)
+                elif self._claim(item, key):
+                    chains[key] = chain = [idx]
+                    units.append(chain)
+                    # элементы, ждавшие повтора владельца, идут сразу за ним
+                    for waiting in self._lanes.pop(key, ()):
+                        chain.append(len(items))
+                        items.append(waiting)
+                continue
+            options = self.batch_options.get(item.type)
+            if options is None:
+                units.append([idx])
+                continue
+            batch = open_batches.get(item.type)
+            if batch is None or len(batch) >= options.max_batch:
+                batch = open_batches[item.type] = []
+                units.append(batch)
+            batch.append(idx)
+        return units
+
+    @staticmethod
+    def _store_results(results: List[Optional[bool]], unit: List[int], unit_results: List[Optional[bool]]) -> None:
+        for idx, ok in zip(unit, unit_results):
+            results[idx] = ok
+
+    async def _process_unit(self, items: List[QueueItem], unit: List[int]) -> List[Optional[bool]]:
+        if items[unit[0]].type in self.batch_options:
+            return await self._process_batch([items[idx] for idx in unit])
+        if len(unit) == 1:
+            return [await self._process(items[unit[0]], unit[0])]
+        return await self._process_chain(items, unit)
+
+    async def _process_chain(self, items: List[QueueItem], unit: List[int]) -> List[Optional[bool]]:
+        """Обрабатывает элементы партиции по порядку; после ошибки с повтором остальные не запускаются (None)."""
+        results: List[Optional[bool]] = [None] * len(unit)
+        for position, idx in enumerate(unit):
+            item = items[idx]
+            results[position] = await self._process(item, idx)
+            if not results[position] and item.try_start > 1:
+                break
+        return results
+
+    async def _process_batch(self, batch: List[QueueItem]) -> List[bool]:
+        type_name = batch[0].type
+        for item in batch:
+            self._release_key(item)
+        try:
+            self.logger.debug("[Queue] Processing batch of %d items of type '%s'", len(batch), type_name)
+            handler = self.handlers.get(type_name)
+            if not handler:
+                raise ValueError(f"No handler registered for type: {type_name}")
+            outcome = await self._invoke(type_name, handler, batch, batch)
+            if outcome is None:
+                if self.metrics is not None:
+                    self.metrics.completed(type_name, True, len(batch))
+                return [True] * len(batch)
+            outcome = list(outcome)
+            if len(outcome) != len(batch):
+                raise ValueError(f"Batch handler returned {len(outcome)} results for {len(batch)} items")
+        except asyncio.CancelledError:
+            self.logger.warning("[Queue] Processing cancelled.")
+            raise
+        except Exception as e:
+            self.logger.error(f"[Queue] Error processing batch of type '{type_name}': {e}", exc_info=True)
+            for item in batch:
+                item._last_error = repr(e)
+            if self.metrics is not None:
+                self.metrics.completed(type_name, False, len(batch))
+            return [False] * len(batch)
+
+        results = []
+        for item, result in zip(batch, outcome):
+            ok = result is None or result is True
+            if not ok:
+                item._last_error = repr(result) if isinstance(result, BaseException) else "Batch handler reported failure"
+                self.logger.error(f"[Queue] Error processing item of type '{type_name}' in batch: {item._last_error}")
+            if self.metrics is not None:
+                self.metrics.completed(type_name, ok)
+            results.append(ok)
+        return results
+
+    async def _process(self, item: QueueItem, idx: Optional[int] = None) -> bool:
+        label = item.type if idx is None else idx + 1
+        # с началом обработки элемент больше не объединяется с новыми
+        self._release_key(item)
+        try:
+            self.logger.debug("[Queue] Processing item %s: %s", label, item)
+            handler = self.handlers.get(item.type)
+            if not handler:
+                raise ValueError(f"No handler registered for type: {item.type}")
+            await self._invoke(item.type, handler, item, (item,))
+            if self.metrics is not None:
+                self.metrics.completed(item.type, True)
+            return True
+        except asyncio.CancelledError:
+            self.logger.warning("[Queue] Processing cancelled.")
+            raise
+        except Exception as e:
+            self.logger.error(f"[Queue] Error processing item {label}: {e}", exc_info=True)
+            item._last_error = repr(e)
+            if self.metrics is not None:
+                self.metrics.completed(item.type, False)
+            return False
+
+    async def _invoke(self, type_name: str, handler: Callable[[Any], Awaitable[Any]], argument: Any, items: Sequence[QueueItem]) -> Any:
+        """Вызывает обработчик с учётом ограничения параллельности типа; время ожидания лимита не входит в задержку."""
+        limit = self.limits.get(type_name)
+        if limit is not None:
+            await limit.acquire()
+        try:
+            if self.metrics is None:
+                return await handler(argument)
+            self.metrics.started(items)
+            started = time.perf_counter()
+            try:
+                return await handler(argument)
+            finally:
+                self.metrics.handled(type_name, time.perf_counter() - started)
+        finally:
+            if limit is not None:
+                limit.release()
+                held = self._held.get(type_name)
+                if held:
+                    self._push(held.popleft())
+                    self._wakeup.set()
+
+    async def _process_pool(self, items: List[QueueItem], units: List[List[int]], results: List[Optional[bool]]) -> None:
+        # воркеры разбирают общий список, результаты сохраняются по индексу для сохранения порядка повторов
+        remaining = deque(units)
+        active = 0
+        released = asyncio.Event()
+
+        def take() -> Optional[List[int]]:
+            # первая единица, чей тип не упирается в лимит параллельности; если заняты все —
+            # ждём освобождения, пока есть что ждать, иначе берём первую (лимит держит кто-то вне прохода)
+            for unit in remaining:
+                if not self._limited(items[unit[0]].type):
+                    remaining.remove(unit)
+                    return unit
+            return remaining.popleft() if not active else None
+
+        async def worker():
+            nonlocal active
+            while remaining:
+                unit = take()
+                if unit is None:
+                    released.clear()
+                    await released.wait()
+                    continue
+                active += 1
+                try:
+                    self._store_results(results, unit, await self._process_unit(items, unit))
+                finally:
+                    active -= 1
+                    released.set()
+
+        await asyncio.gather(*(worker() for _ in range(min(self.workers, len(units)))))
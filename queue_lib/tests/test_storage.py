@@ -0,0 +1,61 @@
+import pytest
+
+from queue_lib.storage import SQLiteStorage
+from queue_lib.types import QueueItem
+from queue_lib.universal_queue import UniversalQueue
+
+
+class Command(QueueItem):
+    type: str = "command"
+    device: str
+
+
+def count_rows(storage: SQLiteStorage) -> int:
+    return len(storage.load("command"))
+
+
+@pytest.mark.asyncio
+async def test_items_recovered_after_restart(tmp_path):
+    """Необработанные элементы восстанавливаются новой очередью из того же каталога"""
+    processed = []
+
+    async def handler(item: Command):
+        processed.append(item.device)
+        if item.device == "bad":
+            raise RuntimeError("offline")
+
+    queue = UniversalQueue({"command": (Command, handler)}, storage=SQLiteStorage(tmp_path))
+    queue.add("command", device="lamp")
+    queue.add("command", device="bad", try_start=3)
+    queue.add("command", device="fan")
+    queue.storage.flush()
+    assert count_rows(queue.storage) == 3
+
+    assert await queue.start() is False
+    queue.close()
+
+    restored = UniversalQueue({"command": (Command, handler)}, storage=SQLiteStorage(tmp_path))
+    assert [item.device for item in restored.pending] == ["bad"]
+    assert restored.pending[0].try_start == 2
+    restored.close()
+
+
+def test_group_commit(tmp_path):
+    """Добавления записываются пачкой, а подтверждённые до записи не попадают на диск"""
+    storage = SQLiteStorage(tmp_path, batch_size=3)
+    first, second = Command(device="a"), Command(device="b")
+    storage.append(first)
+    storage.append(second)
+    assert count_rows(storage) == 0
+
+    storage.ack(first)
+    storage.append(Command(device="c"))
+    assert count_rows(storage) == 0
+
+    storage.append(Command(device="d"))  # третья запись в пачке — flush
+    assert [row[0] for row in storage.load("command")] == [2, 3, 4]
+
+    storage.ack(second)
+    storage.flush()
+    assert count_rows(storage) == 2
+    storage.close()
@@ -160,4 +160,848 @@ async def test_retry_failed_item():
     # "fail" должен обработаться
     assert processed == ["ok", "fail"]
     assert len(queue.queue) == 0
-    assert len(queue.pending) == 0
\ No newline at end of file
+    assert len(queue.pending) == 0
+
+@pytest.mark.asyncio
+async def test_worker_pool_processes_concurrently():
+    """В режиме пула медленный обработчик не задерживает остальные элементы"""
+    active = 0
+    max_active = 0
+
+    async def handler(item: MyItem):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.05)
+        active -= 1
+        if item.data == "bad":
+            raise ValueError("boom")
+
+    queue = UniversalQueue({"my_item": (MyItem, handler)}, workers=3)
+    for data in ["1", "bad", "2", "3", "4"]:
+        queue.add("my_item", data=data, try_start=2)
+
+    result = await queue.start()
+
+    assert result is False
+    assert max_active == 3
+    assert [item.data for item in queue.queue] == ["bad"]
+    assert queue.queue[0].try_start == 1
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_per_type_concurrency():
+    """Ограничение параллельности задаётся для каждого типа отдельно"""
+    active = {"my_item": 0, "error_item": 0}
+    max_active = {"my_item": 0, "error_item": 0}
+
+    async def handler(item):
+        active[item.type] += 1
+        max_active[item.type] = max(max_active[item.type], active[item.type])
+        await asyncio.sleep(0.02)
+        active[item.type] -= 1
+
+    queue = UniversalQueue(workers=4)
+    queue.register("my_item", MyItem, handler, concurrency=1)
+    queue.register("error_item", ErrorItem, handler)
+    for i in range(4):
+        queue.add("my_item", data=str(i))
+        queue.add("error_item", data=str(i))
+
+    assert await queue.start() is True
+    assert max_active["my_item"] == 1
+    assert max_active["error_item"] > 1
+
+
+@pytest.mark.parametrize("mode", ["start", "run"])
+@pytest.mark.asyncio
+async def test_concurrency_limit_does_not_block_other_types(mode):
+    """Воркеры не простаивают на занятом лимите типа, а берут элементы других типов"""
+    loop = asyncio.get_running_loop()
+    begin = loop.time()
+    finished = {}
+
+    async def slow(item):
+        await asyncio.sleep(0.3)
+        finished[item.data] = loop.time() - begin
+
+    async def fast(item):
+        finished[item.data] = loop.time() - begin
+
+    queue = UniversalQueue(workers=4)
+    queue.register("my_item", MyItem, slow, concurrency=1)
+    queue.register("error_item", ErrorItem, fast)
+    for i in range(4):
+        queue.add("my_item", data=f"a{i}")
+    queue.add("error_item", data="b")
+
+    if mode == "start":
+        assert await queue.start() is True
+    else:
+        task = asyncio.create_task(queue.run())
+        while len(finished) < 5:
+            await asyncio.sleep(0.01)
+        queue.stop()
+        await task
+
+    assert finished["b"] < 0.2
+    assert len(finished) == 5
+    assert len(queue.queue) + len(queue.pending) == 0
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.asyncio
+async def test_cancelled_start_keeps_unprocessed_items(workers):
+    """Отменённый start() возвращает в очередь незавершённые элементы"""
+    processed = []
+    blocked = asyncio.Event()
+
+    async def handler(item: MyItem):
+        if item.data == "two" and not blocked.is_set():
+            blocked.set()
+            await asyncio.sleep(10)
+        processed.append(item.data)
+
+    queue = UniversalQueue(workers=workers)
+    queue.register("my_item", MyItem, handler, concurrency=1)
+    for data in ("one", "two", "three"):
+        queue.add("my_item", data=data)
+
+    task = asyncio.create_task(queue.start())
+    await blocked.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert processed == ["one"]
+    assert sorted(item.data for item in queue.queue) == ["three", "two"]
+
+    assert await queue.start() is True
+    assert sorted(processed) == ["one", "three", "two"]
+    assert len(queue.queue) == 0
+
+
+@pytest.mark.asyncio
+async def test_run_processes_items_on_add():
+    """В непрерывном режиме элемент обрабатывается сразу после add()"""
+    handled = asyncio.Event()
+    processed = []
+
+    async def handler(item: MyItem):
+        processed.append(item.data)
+        if item.data == "bad" and item.try_start == 2:
+            raise ValueError("boom")
+        if len(processed) == 3:
+            handled.set()
+
+    queue = UniversalQueue({"my_item": (MyItem, handler)}, workers=2)
+    task = asyncio.create_task(queue.run())
+    await asyncio.sleep(0)
+
+    queue.add("my_item", data="ok")
+    queue.add("my_item", data="bad", try_start=2)
+    await asyncio.wait_for(handled.wait(), 1)
+
+    queue.stop()
+    await asyncio.wait_for(task, 1)
+    assert sorted(processed) == ["bad", "bad", "ok"]
+    assert len(queue.pending) == 0
+    assert len(queue.queue) == 0
+
+
+@pytest.mark.asyncio
+async def test_priority_order():
+    """Элементы с большим приоритетом обрабатываются раньше, при равном — FIFO"""
+    processed = []
+
+    async def handler(item):
+        processed.append(item.data)
+
+    queue = UniversalQueue()
+    queue.register("my_item", MyItem, handler)
+    queue.register("error_item", ErrorItem, handler, priority=5)
+
+    queue.add("my_item", data="sync1")
+    queue.add("my_item", data="sync2")
+    queue.add("error_item", data="command")
+    queue.add("my_item", data="urgent", priority=10)
+
+    assert await queue.start() is True
+    assert processed == ["urgent", "command", "sync1", "sync2"]
+
+
+@pytest.mark.asyncio
+async def test_expired_items_are_skipped(caplog):
+    """Элемент с истёкшим дедлайном удаляется без вызова обработчика"""
+    from datetime import datetime, timedelta
+    processed = []
+
+    async def handler(item: MyItem):
+        processed.append(item.data)
+
+    queue = UniversalQueue({"my_item": (MyItem, handler)})
+    queue.add("my_item", data="late", deadline=datetime.now() - timedelta(seconds=1))
+    queue.add("my_item", data="in_time", deadline=datetime.now() + timedelta(seconds=60))
+
+    assert await queue.start() is True
+    assert processed == ["in_time"]
+    assert len(queue.queue) == 0
+    assert "expired" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_delayed_retry_with_backoff():
+    """Повтор с задержкой не попадает в очередь до наступления срока"""
+    from queue_lib.types import RetryPolicy
+    attempts = []
+
+    async def handler(item: MyItem):
+        attempts.append(item.try_start)
+        if item.try_start > 1:
+            raise ValueError("downstream down")
+
+    queue = UniversalQueue()
+    queue.register("my_item", MyItem, handler, retry=RetryPolicy(delay=0.05, jitter=0))
+    queue.add("my_item", data="x", try_start=2)
+
+    assert await queue.start() is False
+    assert len(queue.queue) == 0
+    assert len(queue.delayed) == 1
+
+    assert await queue.start() is True  # срок ещё не наступил
+    assert attempts == [2]
+
+    await asyncio.sleep(0.06)
+    assert await queue.start() is True
+    assert attempts == [2, 1]
+    assert len(queue.delayed) == 0
+
+
+def test_retry_policy_backoff():
+    from queue_lib.types import RetryPolicy
+    policy = RetryPolicy(delay=1, factor=2, max_delay=5, jitter=0)
+    assert [policy.next_delay(attempt) for attempt in range(1, 5)] == [1, 2, 4, 5]
+    assert RetryPolicy().next_delay(3) == 0
+
+
+@pytest.mark.asyncio
+async def test_dead_letters_and_replay():
+    """Исчерпавшие попытки элементы сохраняются в dead_letters и могут быть возвращены"""
+    fail = True
+    processed = []
+
+    async def handler(item: MyItem):
+        if fail:
+            raise RuntimeError("boom")
+        processed.append(item.data)
+
+    queue = UniversalQueue({"my_item": (MyItem, handler)}, dead_letter_size=2)
+    for data in ["a", "b", "c"]:
+        queue.add("my_item", data=data)
+
+    assert await queue.start() is False
+    assert [letter.item.data for letter in queue.dead_letters] == ["b", "c"]
+    assert "boom" in queue.dead_letters[0].error
+
+    fail = False
+    assert queue.replay_dead_letters("my_item", try_start=3) == 2
+    assert len(queue.dead_letters) == 0
+    assert await queue.start() is True
+    assert processed == ["b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_batch_handler_in_start():
+    """Пакетный обработчик получает элементы пачками и сообщает результат по каждому"""
+    batches = []
+
+    async def batch_handler(items):
+        batches.append([item.data for item in items])
+        return [ValueError("bad") if item.data == "bad" else True for item in items]
+
+    queue = UniversalQueue()
+    queue.register_batch("my_item", MyItem, batch_handler, max_batch=2)
+    for data in ["1", "bad", "3"]:
+        queue.add("my_item", data=data, try_start=2)
+
+    assert await queue.start() is False
+    assert batches == [["1", "bad"], ["3"]]
+    assert [item.data for item in queue.queue] == ["bad"]
+    assert queue.queue[0].try_start == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_handler_in_run_waits_for_batch():
+    """В run() пачка собирается из элементов, накопившихся за max_wait_ms"""
+    batches = []
+    done = asyncio.Event()
+
+    async def batch_handler(items):
+        batches.append([item.data for item in items])
+        done.set()
+
+    queue = UniversalQueue()
+    queue.register_batch("my_item", MyItem, batch_handler, max_batch=10, max_wait_ms=50)
+    task = asyncio.create_task(queue.run())
+    await asyncio.sleep(0)
+
+    queue.add("my_item", data="1")
+    await asyncio.sleep(0.01)
+    queue.add("my_item", data="2")
+    await asyncio.wait_for(done.wait(), 1)
+
+    queue.stop()
+    await asyncio.wait_for(task, 1)
+    assert batches == [["1", "2"]]
+
+
+class StateItem(QueueItem):
+    type: str = "state"
+    device: str
+    value: int
+
+
+@pytest.mark.asyncio
+async def test_coalesce_latest_and_first():
+    """Элементы с одинаковым ключом объединяются, пока ожидают обработки"""
+    from queue_lib.types import MergePolicy
+    processed = []
+
+    async def handler(item: StateItem):
+        processed.append((item.device, item.value))
+
+    queue = UniversalQueue()
+    queue.register("state", StateItem, handler, coalesce_key=lambda item: item.device)
+    queue.add("state", device="lamp", value=1)
+    queue.add("state", device="fan", value=1)
+    queue.add("state", device="lamp", value=2)
+    queue.add("state", device="lamp", value=3)
+
+    assert len(queue.pending) == 2
+    assert await queue.start() is True
+    assert processed == [("lamp", 3), ("fan", 1)]
+
+    # после извлечения элемент больше не объединяется
+    processed.clear()
+    queue.register("state", StateItem, handler, coalesce_key=lambda item: item.device, merge=MergePolicy.FIRST)
+    queue.add("state", device="lamp", value=4)
+    queue.add("state", device="lamp", value=5)
+    assert await queue.start() is True
+    assert processed == [("lamp", 4)]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_custom_merge():
+    processed = []
+
+    async def handler(item: StateItem):
+        processed.append(item.value)
+
+    def merge(pending: StateItem, new: StateItem) -> StateItem:
+        return StateItem(device=pending.device, value=pending.value + new.value)
+
+    queue = UniversalQueue()
+    queue.register("state", StateItem, handler, coalesce_key=lambda item: item.device, merge=merge)
+    for value in [1, 2, 3]:
+        queue.add("state", device="counter", value=value)
+
+    assert await queue.start() is True
+    assert processed == [6]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_while_batch_is_collected():
+    """Элементы, накапливающиеся в пачке run(), продолжают объединяться"""
+    batches = []
+    done = asyncio.Event()
+
+    async def batch_handler(items):
+        batches.append([(item.device, item.value) for item in items])
+        done.set()
+
+    queue = UniversalQueue()
+    queue.register_batch("state", StateItem, batch_handler, max_batch=10, max_wait_ms=50,
+                         coalesce_key=lambda item: item.device)
+    task = asyncio.create_task(queue.run())
+    await asyncio.sleep(0)
+
+    queue.add("state", device="lamp", value=1)
+    await asyncio.sleep(0.01)
+    queue.add("state", device="fan", value=1)
+    queue.add("state", device="lamp", value=2)
+    await asyncio.wait_for(done.wait(), 1)
+
+    queue.stop()
+    await asyncio.wait_for(task, 1)
+    assert batches == [[("lamp", 2), ("fan", 1)]]
+
+
+@pytest.mark.asyncio
+async def test_overflow_policies():
+    """Переполнение: reject, drop_oldest, drop_newest"""
+    from queue_lib.types import OverflowPolicy, QueueFullError
+    handler = AsyncMock()
+
+    queue = UniversalQueue(max_size=2)
+    queue.register("my_item", MyItem, handler)
+    queue.register("error_item", ErrorItem, handler, max_size=1, overflow=OverflowPolicy.DROP_NEWEST)
+    queue.add("my_item", data="1")
+    queue.add("error_item", data="a")
+    queue.add("error_item", data="b")  # отброшен лимитом типа
+    with pytest.raises(QueueFullError):
+        queue.add("my_item", data="2")
+    assert queue.size() == 2
+
+    queue.overflow = OverflowPolicy.DROP_OLDEST
+    queue.add("my_item", data="3")
+    assert [item.data for item in queue.pending] == ["a", "3"]
+    assert queue.size("my_item") == 1
+
+    assert await queue.start() is True
+    assert queue.size() == 0
+
+
+@pytest.mark.asyncio
+async def test_drop_oldest_without_waiting_items_drops_new():
+    """drop_oldest не может вытеснить элементы в обработке и отбрасывает новый"""
+    from queue_lib.metrics import QueueMetrics
+    from queue_lib.types import OverflowPolicy
+    started = asyncio.Event()
+    release = asyncio.Event()
+    processed = []
+
+    async def handler(item: MyItem):
+        processed.append(item.data)
+        if len(processed) == 2:
+            started.set()
+        await release.wait()
+
+    metrics = QueueMetrics()
+    queue = UniversalQueue({"my_item": (MyItem, handler)}, workers=2, max_size=2,
+                           overflow=OverflowPolicy.DROP_OLDEST, metrics=metrics)
+    queue.add("my_item", data="1")
+    queue.add("my_item", data="2")
+    task = asyncio.create_task(queue.run())
+    await started.wait()
+
+    queue.add("my_item", data="3")
+    assert queue.size() == 2
+    assert queue.stats()["my_item"].dropped == {"overflow": 1}
+
+    release.set()
+    while queue.size():
+        await asyncio.sleep(0.01)
+    queue.stop()
+    await task
+    assert processed == ["1", "2"]
+
+
+@pytest.mark.asyncio
+async def test_put_waits_for_space_and_watermarks():
+    """put() ждёт места, а watermark-колбэки сообщают о заполнении очереди"""
+    events = []
+
+    async def handler(item: MyItem):
+        pass
+
+    queue = UniversalQueue(
+        {"my_item": (MyItem, handler)},
+        max_size=2,
+        high_watermark=2,
+        on_high_watermark=lambda q: events.append(("high", q.size())),
+        on_low_watermark=lambda q: events.append(("low", q.size())),
+    )
+    await queue.put("my_item", data="1")
+    await queue.put("my_item", data="2")
+    assert events == [("high", 2)]
+
+    waiter = asyncio.create_task(queue.put("my_item", data="3"))
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    await queue.start()
+    await asyncio.wait_for(waiter, 1)
+    assert events == [("high", 2), ("low", 1)]
+    assert [item.data for item in queue.pending] == ["3"]
+
+
+@pytest.mark.asyncio
+async def test_add_many_and_add_item():
+    """Пакетное добавление валидирует весь список, готовые элементы добавляются без валидации"""
+    from pydantic import ValidationError
+    handler = AsyncMock()
+    queue = UniversalQueue({"my_item": (MyItem, handler)})
+
+    assert queue.add_many("my_item", [{"data": "1"}, MyItem(data="2")]) == 2
+    queue.add_item(MyItem(data="3"))
+    assert [item.data for item in queue.pending] == ["1", "2", "3"]
+
+    with pytest.raises(ValidationError):
+        queue.add_many("my_item", [{"data": "4"}, {"wrong": "field"}])
+    assert len(queue.pending) == 3
+
+    with pytest.raises(ValueError, match="Unknown queue type"):
+        queue.add_item(ErrorItem(data="x"))
+
+    assert await queue.start() is True
+    assert handler.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_partition_retry_blocks_only_its_lane():
+    """Повтор элемента блокирует только его партицию, порядок внутри партиции сохраняется"""
+    from queue_lib.types import RetryPolicy
+    processed = []
+    failed = set()
+
+    async def handler(item: StateItem):
+        if item.value == 1 and item.device not in failed and item.device == "lamp":
+            failed.add(item.device)
+            raise RuntimeError("offline")
+        processed.append((item.device, item.value))
+
+    queue = UniversalQueue(workers=2)
+    queue.register("state", StateItem, handler, partition_key=lambda item: item.device,
+                   retry=RetryPolicy(delay=0.05, jitter=0))
+    queue.add("state", device="lamp", value=1, try_start=2)
+    queue.add("state", device="lamp", value=2)
+    queue.add("state", device="fan", value=1)
+    queue.add("state", device="fan", value=2)
+
+    assert await queue.start() is False
+    assert processed == [("fan", 1), ("fan", 2)]
+
+    queue.add("state", device="lamp", value=3)
+    queue.add("state", device="fan", value=3)
+    assert await queue.start() is True
+    assert processed[-1] == ("fan", 3)
+    assert ("lamp", 3) not in processed
+
+    await asyncio.sleep(0.06)
+    assert await queue.start() is True
+    assert [value for device, value in processed if device == "lamp"] == [1, 2, 3]
+    assert queue.size() == 0
+
+
+@pytest.mark.asyncio
+async def test_partitions_in_run_mode():
+    """В run() элементы одной партиции идут по порядку, разные партиции — параллельно"""
+    active = {}
+    overlap = False
+    processed = []
+    done = asyncio.Event()
+
+    async def handler(item: StateItem):
+        nonlocal overlap
+        active[item.device] = active.get(item.device, 0) + 1
+        overlap = overlap or active[item.device] > 1
+        await asyncio.sleep(0.01)
+        active[item.device] -= 1
+        processed.append((item.device, item.value))
+        if len(processed) == 6:
+            done.set()
+
+    queue = UniversalQueue(workers=3)
+    queue.register("state", StateItem, handler, partition_key=lambda item: item.device)
+    task = asyncio.create_task(queue.run())
+    for value in range(3):
+        queue.add("state", device="lamp", value=value)
+        queue.add("state", device="fan", value=value)
+    await asyncio.wait_for(done.wait(), 1)
+    queue.stop()
+    await asyncio.wait_for(task, 1)
+
+    assert not overlap
+    assert [value for device, value in processed if device == "lamp"] == [0, 1, 2]
+    assert [value for device, value in processed if device == "fan"] == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_partition_lane_items_still_coalesce():
+    """Элементы, ждущие в партиции повтора предыдущего, продолжают объединяться"""
+    from queue_lib.types import RetryPolicy
+    handled = []
+
+    async def handler(item: StateItem):
+        if item.value == 0 and item.try_start == 2:
+            raise RuntimeError("offline")
+        handled.append(item.value)
+
+    queue = UniversalQueue()
+    queue.register("state", StateItem, handler, partition_key=lambda item: item.device,
+                   coalesce_key=lambda item: item.device, retry=RetryPolicy(delay=0.1, jitter=0))
+    queue.add("state", device="lamp", value=0, try_start=2)
+    assert await queue.start() is False
+
+    queue.add("state", device="lamp", value=1)
+    assert await queue.start() is True  # элемент встаёт за повтором в партиции
+    for value in range(2, 6):
+        queue.add("state", device="lamp", value=value)
+    assert queue.size() == 2
+
+    await asyncio.sleep(0.12)
+    while queue.size():
+        assert await queue.start() is True
+    assert handled == [0, 5]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_run_keeps_item_in_progress():
+    """Отмена run() во время обработки возвращает элемент в очередь и освобождает место"""
+    started = asyncio.Event()
+    processed = []
+
+    async def handler(item: StateItem):
+        if not started.is_set():
+            started.set()
+            await asyncio.sleep(10)
+        processed.append(item.value)
+
+    queue = UniversalQueue(max_size=1)
+    queue.register("state", StateItem, handler, partition_key=lambda item: item.device)
+    queue.add("state", device="lamp", value=1)
+
+    task = asyncio.create_task(queue.run())
+    await asyncio.wait_for(started.wait(), 1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert queue.size() == 1
+    assert [item.value for item in queue.pending] == [1]
+
+    task = asyncio.create_task(queue.run())
+    while not processed:
+        await asyncio.sleep(0.01)
+    queue.stop()
+    await asyncio.wait_for(task, 1)
+
+    assert processed == [1]
+    assert queue.size() == 0
+    assert queue._owners == {}
+    queue.add("state", device="lamp", value=2)  # место освободилось
+
+
+@pytest.mark.asyncio
+async def test_stats_with_metrics_and_sink():
+    """Метрики: счётчики, время ожидания, гистограмма задержек и события в sink"""
+    from queue_lib.metrics import QueueMetrics, MetricsSink
+    from queue_lib.types import RetryPolicy, QueueFullError
+
+    class Sink(MetricsSink):
+        def __init__(self):
+            self.events = []
+
+        def increment(self, name, type_name, value=1):
+            self.events.append((name, type_name, value))
+
+    sink = Sink()
+    queue = UniversalQueue(metrics=QueueMetrics(sink), max_size=3)
+    queue.register("my_item", MyItem, AsyncMock())
+    queue.register("error_item", ErrorItem, AsyncMock(side_effect=ValueError), retry=RetryPolicy(delay=0, jitter=0))
+    queue.add("my_item", data="1")
+    queue.add("my_item", data="2")
+    queue.add("error_item", data="x", try_start=1)
+    with pytest.raises(QueueFullError):
+        queue.add("my_item", data="3")
+    await asyncio.sleep(0.01)
+
+    await queue.start()
+    stats = queue.stats()
+    assert stats["my_item"].enqueued == 2
+    assert stats["my_item"].dropped == {"overflow": 1}
+    assert stats["my_item"].processed == 2
+    assert stats["my_item"].depth == 0
+    assert stats["my_item"].wait_time_max >= 0.01
+    assert sum(stats["my_item"].latency_buckets.values()) == 2
+    assert stats["error_item"].failed == 1
+    assert stats["error_item"].dropped == {"dead_letter": 1}
+    assert ("processed", "my_item", 1) in sink.events
+    assert ("dropped.dead_letter", "error_item", 1) in sink.events
+
+
+@pytest.mark.asyncio
+async def test_stats_without_metrics_reports_depth():
+    """Без metrics stats() возвращает только глубину очереди"""
+    queue = UniversalQueue()
+    queue.register("my_item", MyItem, AsyncMock())
+    queue.add("my_item", data="1")
+    stats = queue.stats()
+    assert stats["my_item"].depth == 1
+    assert stats["my_item"].processed == 0
+
+
+def _check_data(batch):
+    """Синхронный пакетный обработчик для пула процессов (должен быть доступен по имени модуля)"""
+    return [item.data != "bad" for item in batch]
+
+
+@pytest.mark.asyncio
+async def test_thread_executor_handler_and_retry():
+    """Синхронный обработчик в пуле потоков, исключения уходят в повторы"""
+    import threading
+    from queue_lib.types import Executor
+    threads = set()
+    calls = []
+
+    def handler(item: MyItem):
+        threads.add(threading.current_thread().name)
+        calls.append(item.data)
+        if item.data == "bad":
+            raise ValueError("bad item")
+
+    queue = UniversalQueue(pool_workers=2)
+    queue.register("my_item", MyItem, handler, executor=Executor.THREAD)
+    queue.add("my_item", data="ok")
+    queue.add("my_item", data="bad", try_start=2)
+    assert await queue.start() is False
+    assert await queue.start() is False
+    queue.close()
+
+    assert sorted(calls) == ["bad", "bad", "ok"]
+    assert threading.current_thread().name not in threads
+    assert queue.dead_letters[0].error == "ValueError('bad item')"
+
+
+@pytest.mark.asyncio
+async def test_process_executor_batch_handler():
+    """Пакетный обработчик в пуле процессов возвращает результаты по элементам"""
+    from queue_lib.types import Executor
+
+    queue = UniversalQueue(pool_workers=1)
+    queue.register_batch("my_item", MyItem, _check_data, executor=Executor.PROCESS)
+    queue.add("my_item", data="a")
+    queue.add("my_item", data="bad", try_start=1)
+    queue.add("my_item", data="b")
+    assert await queue.start() is False
+    queue.close()
+
+    assert queue.size() == 0
+    assert [letter.item.data for letter in queue.dead_letters] == ["bad"]
+
+
+@pytest.mark.asyncio
+async def test_loopback_transport_distributes_items():
+    """add() на узле-отправителе публикует элементы, run() на узлах-обработчиках их обрабатывает"""
+    from queue_lib.transport import LoopbackTransport
+    transport = LoopbackTransport()
+    processed = {}
+    failed = []
+    done = asyncio.Event()
+
+    def make_handler(node):
+        async def handler(item: MyItem):
+            if item.data == "flaky" and not failed:
+                failed.append(node)
+                raise RuntimeError("retry me")
+            processed.setdefault(node, []).append(item.data)
+            if sum(len(values) for values in processed.values()) == 4:
+                done.set()
+        return handler
+
+    producer = UniversalQueue(transport=transport)
+    producer.register("my_item", MyItem, AsyncMock())
+    producer.add("my_item", data="a")  # узлов ещё нет — ждёт в backlog
+    workers = []
+    for node in ("n1", "n2"):
+        worker = UniversalQueue(transport=transport)
+        worker.register("my_item", MyItem, make_handler(node))
+        workers.append((worker, asyncio.create_task(worker.run())))
+    await asyncio.sleep(0)
+    producer.add_many("my_item", [{"data": "b"}, {"data": "flaky", "try_start": 2}])
+    producer.add("my_item", data="c")
+    assert producer.size() == 0
+
+    await asyncio.wait_for(done.wait(), 1)
+    for worker, task in workers:
+        worker.stop()
+        await asyncio.wait_for(task, 1)
+
+    assert sorted(data for values in processed.values() for data in values) == ["a", "b", "c", "flaky"]
+    assert len(processed) == 2
+
+
+@pytest.mark.asyncio
+async def test_rabbitmq_transport_acks_after_processing(monkeypatch):
+    """Сообщение RabbitMQ подтверждается после обработки элемента, отклонённое очередью возвращается брокеру"""
+    import json, sys, types
+    from unittest.mock import MagicMock
+    from queue_lib import transport as transport_module
+    from queue_lib.transport import RabbitMQTransport
+
+    published = []
+
+    class FakeProducer:
+        def __init__(self, **kwargs):
+            self.close = MagicMock()
+
+        def publish(self, message):
+            published.append(message)
+
+    rabitmq = types.ModuleType("rabitmq")
+    rabitmq.RabbitMQProducer = FakeProducer
+    monkeypatch.setitem(sys.modules, "rabitmq", rabitmq)
+    monkeypatch.setattr(transport_module._Subscriber, "start", lambda self: None)
+
+    class FakeChannel:
+        is_open = True
+
+        def __init__(self):
+            self.settled = []
+
+        def basic_ack(self, tag):
+            self.settled.append((tag, "ack"))
+
+        def basic_nack(self, tag, requeue):
+            self.settled.append((tag, "requeue" if requeue else "reject"))
+
+    class FakeConnection:
+        def add_callback_threadsafe(self, callback):
+            callback()
+
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def handler(item: MyItem):
+        started.set()
+        await release.wait()
+        if item.data == "bad":
+            raise ValueError("bad item")
+
+    transport = RabbitMQTransport(prefetch_count=5)
+    queue = UniversalQueue(transport=transport, max_size=1)
+    queue.register("my_item", MyItem, handler)
+    queue.add("my_item", data="a")
+    transport.close()
+    assert published == [{"type": "my_item", "try_start": 1, "priority": None, "deadline": None, "data": "a"}]
+
+    task = asyncio.create_task(queue.run())
+    await asyncio.sleep(0)
+    subscriber = transport._consumers[queue._receive]
+    channel, connection = FakeChannel(), FakeConnection()
+
+    def deliver(tag, message):
+        subscriber._on_message(connection, channel, tag, json.dumps(message).encode())
+
+    deliver(1, published[0])
+    await asyncio.wait_for(started.wait(), 1)
+    assert channel.settled == []  # элемент ещё обрабатывается
+
+    deliver(2, {"type": "my_item", "data": "b"})  # переполнение — сообщение возвращается брокеру
+    deliver(3, {"type": "unknown"})  # невалидное сообщение отклоняется без возврата
+    await asyncio.sleep(0.01)
+    assert channel.settled == [(2, "requeue"), (3, "reject")]
+
+    release.set()
+    while len(channel.settled) < 3:
+        await asyncio.sleep(0.01)
+    assert channel.settled[2] == (1, "ack")
+
+    deliver(4, {"type": "my_item", "data": "bad"})  # элемент, ушедший в dead letters, тоже подтверждается
+    while len(channel.settled) < 4:
+        await asyncio.sleep(0.01)
+    assert channel.settled[3] == (4, "ack")
+    assert [letter.item.data for letter in queue.dead_letters] == ["bad"]
+
+    queue.stop()
+    await asyncio.wait_for(task, 1)
+    assert transport._consumers == {}
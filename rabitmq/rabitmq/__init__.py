@@ -1,3 +1,7 @@
-from .consumer import QueueConsumer, FanoutConsumer
-from .producer import RabbitMQProducer, RabbitMQProducerFanout
-from .sender import FanoutSender, QueueSender
\ No newline at end of file
+from .consumer import QueueConsumer, FanoutConsumer, ExchangeConsumer, NackPolicy, topic_matches
+from .producer import RabbitMQProducer, RabbitMQProducerFanout, RabbitMQProducerExchange
+from .async_producer import AsyncRabbitMQProducer, AsyncRabbitMQProducerFanout, AsyncRabbitMQProducerExchange
+from .threaded_producer import ThreadedRabbitMQProducer, ProducerClosedError
+from .codecs import Codec, JsonCodec, OrjsonCodec, MsgpackCodec, RawCodec, register_codec, get_codec
+from .connection import ConnectionManager, SharedConnection, default_connection_manager
+from .sender import FanoutSender, QueueSender, ExchangeSender
\ No newline at end of file
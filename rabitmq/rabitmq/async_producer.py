@@ -0,0 +1,306 @@
+import pika
+import logging
+import asyncio
+from .connection import SharedConnection, default_connection_manager
+from .codecs import get_codec
+from .compression import check_compression, compress
+
+
+class PublishNackError(Exception):
+    """Брокер отклонил сообщение (basic.nack) и повторы исчерпаны"""
+
+
+# ===========================
+# Базовый класс асинхронного Producer
+# ===========================
+class BaseAsyncRabbitMQProducer:
+    """
+    Producer на AsyncioConnection: соединение и публикация не блокируют цикл событий.
+    connect() только разрешает подключение, само соединение открывается при первом publish().
+
+    confirm_window > 0 включает подтверждения публикации (publisher confirms): publish() завершается после
+    basic.ack, одновременно без подтверждения находится не больше confirm_window сообщений,
+    отклонённые и потерянные при обрыве соединения сообщения публикуются повторно до max_retries раз.
+    batch_size > 1 включает буфер: сообщения отправляются пачкой по заполнении буфера или через flush_interval.
+    По умолчанию канал открывается в общем соединении connection_manager (один TCP на host/port для всех producers);
+    shared_connection=False — собственное соединение.
+    compression ('zlib' / 'lzma') сжимает тела от compress_threshold байт и отмечает их в content_encoding.
+    """
+    exchange = ''
+    routing_key = ''
+
+    def __init__(self, host='localhost', port=5672, logger=None, connect_timeout=5,
+                 confirm_window=0, batch_size=1, flush_interval=0.005, max_retries=3,
+                 shared_connection=True, connection_manager=None, codec='json', compression=None, compress_threshold=1024):
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.confirm_window = confirm_window
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        check_compression(compression)
+        self.codec = get_codec(codec)
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.connection_manager = (connection_manager or default_connection_manager) if shared_connection else None
+        self._shared = None
+        self.connection = None
+        self.channel = None
+        self._ready = None  # future готовности канала текущей попытки подключения
+        self._buffer = []  # ((body, content_encoding, routing_key), future, attempt), ожидающие отправки
+        self._flush_handle = None
+        self._flush_tasks = set()
+        self._window = asyncio.Semaphore(confirm_window) if confirm_window else None
+        self._outstanding = {}  # delivery_tag -> (body, future, attempt), ожидающие подтверждения
+        self._delivery_tag = 0
+        self.logger = logger or logging.getLogger(__name__)
+
+    def connect(self):
+        pass
+
+    async def _ensure_channel(self):
+        if self.channel is not None and self.channel.is_open:
+            return self.channel
+        if self._ready is None or self._ready.done():
+            self._ready = asyncio.get_running_loop().create_future()
+            self._open(self._ready)
+        try:
+            await asyncio.wait_for(asyncio.shield(self._ready), self.connect_timeout)
+        except BaseException:
+            if not self._ready.done():
+                self._abort()
+            raise
+        return self.channel
+
+    def _acquire(self):
+        if self._shared is None:
+            if self.connection_manager is not None:
+                self._shared = self.connection_manager.acquire(self)
+            else:
+                self._shared = SharedConnection(self.host, self.port, logger=self.logger)
+                self._shared.producers.add(self)
+        return self._shared
+
+    def _open(self, ready):
+        def on_open(connection):
+            self.connection = connection
+            connection.channel(on_open_callback=on_channel_open)
+
+        def on_channel_open(channel):
+            channel.add_on_close_callback(on_channel_closed)
+            if self._window is not None:
+                self._declare(channel, lambda: channel.confirm_delivery(self._on_confirm, callback=lambda frame: on_declared(channel)))
+            else:
+                self._declare(channel, lambda: on_declared(channel))
+
+        def on_declared(channel):
+            self.channel = channel
+            self._delivery_tag = 0
+            if not ready.done():
+                ready.set_result(channel)
+
+        def on_error(error):
+            if not ready.done():
+                ready.set_exception(error)
+
+        def on_channel_closed(channel, reason):
+            if channel is self.channel:
+                self.channel = None
+                self._requeue_outstanding()
+            if not ready.done():
+                ready.set_exception(pika.exceptions.ChannelClosed(0, str(reason)))
+
+        self._acquire().open(on_open, on_error)
+
+    def _connection_lost(self, reason):
+        self.channel = None
+        self.connection = None
+        self._requeue_outstanding()
+        if self._ready is not None and not self._ready.done():
+            self._ready.set_exception(pika.exceptions.AMQPConnectionError(reason))
+
+    def _resume(self):
+        """После переподключения соединения заново открывает канал и объявляет топологию."""
+        if self.channel is None and (self._ready is None or self._ready.done()):
+            self._ready = asyncio.get_running_loop().create_future()
+            self._ready.add_done_callback(lambda future: future.cancelled() or future.exception())
+            self._open(self._ready)
+
+    def _abort(self):
+        self.channel = None
+        if self.connection_manager is None and self._shared is not None:
+            self._shared.close()
+
+    def _declare(self, channel, done):
+        done()
+
+    async def publish(self, message, routing_key=None):
+        await self._send([self._prepare(message, routing_key)])
+        self.logger.debug(f"Published message to '{self.exchange or self.routing_key}': {message}")
+
+    async def publish_many(self, messages, routing_key=None):
+        """Публикует сообщения одной пачкой; при подтверждениях ждёт подтверждения всех."""
+        bodies = [self._prepare(message, routing_key) for message in messages]
+        await self._send(bodies)
+        self.logger.debug(f"Published {len(bodies)} messages to '{self.exchange or self.routing_key}'")
+
+    def _prepare(self, message, routing_key=None):
+        body, encoding = compress(self.codec.encode(message), self.compression, self.compress_threshold)
+        return body, encoding, self.routing_key if routing_key is None else routing_key
+
+    async def _send(self, bodies):
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in bodies]
+        self._buffer.extend((body, future, 0) for body, future in zip(bodies, futures))
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+        else:
+            self._schedule_flush(self.flush_interval)
+        await asyncio.gather(*futures)
+
+    def _schedule_flush(self, delay):
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        task = asyncio.ensure_future(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self):
+        """Отправляет накопленный буфер."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        buffer, self._buffer = self._buffer, []
+        if not buffer:
+            return
+        try:
+            channel = await self._ensure_channel()
+        except Exception as e:
+            for body, future, attempt in buffer:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        properties = {}
+        for index, (body, future, attempt) in enumerate(buffer):
+            if self._window is not None:
+                await self._window.acquire()
+                if channel is not self.channel:
+                    # канал закрылся, пока ждали окна: остаток публикуем на новом канале
+                    self._window.release()
+                    self._buffer[:0] = buffer[index:]
+                    self._schedule_flush(0)
+                    return
+            try:
+                payload, encoding, routing_key = body
+                if encoding not in properties:
+                    extra = {'content_encoding': encoding} if encoding else {}
+                    properties[encoding] = pika.BasicProperties(delivery_mode=2, content_type=self.codec.content_type, **extra)
+                channel.basic_publish(exchange=self.exchange, routing_key=routing_key, body=payload, properties=properties[encoding])
+            except Exception as e:
+                if self._window is not None:
+                    self._window.release()
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if self._window is None:
+                if not future.done():
+                    future.set_result(None)
+            else:
+                self._delivery_tag += 1
+                self._outstanding[self._delivery_tag] = (body, future, attempt)
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        if method.multiple:
+            tags = [tag for tag in self._outstanding if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        for tag in tags:
+            entry = self._outstanding.pop(tag, None)
+            if entry is None:
+                continue
+            self._window.release()
+            body, future, attempt = entry
+            if acked:
+                if not future.done():
+                    future.set_result(None)
+            else:
+                self._retry(body, future, attempt, PublishNackError(f"Message nacked by broker after {attempt + 1} attempts"))
+
+    def _requeue_outstanding(self):
+        outstanding, self._outstanding = self._outstanding, {}
+        for body, future, attempt in outstanding.values():
+            self._window.release()
+            self._retry(body, future, attempt, pika.exceptions.AMQPConnectionError("Connection lost before confirm"))
+
+    def _retry(self, body, future, attempt, error):
+        if future.done():
+            return
+        if attempt >= self.max_retries:
+            future.set_exception(error)
+            return
+        self.logger.warning(f"Republishing unconfirmed message (attempt {attempt + 2})")
+        self._buffer.append((body, future, attempt + 1))
+        self._schedule_flush(0)
+
+    def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        channel, self.channel = self.channel, None
+        if channel is not None and channel.is_open:
+            channel.close()
+        shared, self._shared = self._shared, None
+        if shared is not None:
+            if self.connection_manager is not None:
+                self.connection_manager.release(self, shared)
+            else:
+                shared.producers.discard(self)
+                shared.close()
+        self.connection = None
+
+
+class AsyncRabbitMQProducer(BaseAsyncRabbitMQProducer):
+    def __init__(self, host='localhost', port=5672, queue_name='default_queue', logger=None, **kwargs):
+        super().__init__(host, port, logger, **kwargs)
+        self.queue_name = queue_name
+        self.routing_key = queue_name
+
+    def _declare(self, channel, done):
+        def on_declared(frame):
+            self.logger.info(f"Queue '{self.queue_name}' declared")
+            done()
+        channel.queue_declare(queue=self.queue_name, durable=False, callback=on_declared)
+
+
+class AsyncRabbitMQProducerFanout(BaseAsyncRabbitMQProducer):
+    def __init__(self, host='localhost', port=5672, exchange_name='broadcast', logger=None, **kwargs):
+        super().__init__(host, port, logger, **kwargs)
+        self.exchange_name = exchange_name
+        self.exchange = exchange_name
+
+    def _declare(self, channel, done):
+        def on_declared(frame):
+            self.logger.info(f"Fanout exchange '{self.exchange_name}' declared")
+            done()
+        channel.exchange_declare(exchange=self.exchange_name, exchange_type='fanout', callback=on_declared)
+
+
+class AsyncRabbitMQProducerExchange(BaseAsyncRabbitMQProducer):
+    """Публикация в topic- или direct-exchange: routing key передаётся в publish() / publish_many()."""
+    def __init__(self, host='localhost', port=5672, exchange_name='events', exchange_type='topic', logger=None, **kwargs):
+        super().__init__(host, port, logger, **kwargs)
+        self.exchange_name = exchange_name
+        self.exchange_type = exchange_type
+        self.exchange = exchange_name
+
+    def _declare(self, channel, done):
+        def on_declared(frame):
+            self.logger.info(f"{self.exchange_type.capitalize()} exchange '{self.exchange_name}' declared")
+            done()
+        channel.exchange_declare(exchange=self.exchange_name, exchange_type=self.exchange_type, callback=on_declared)
@@ -0,0 +1,113 @@
+import json
+
+# ===========================
+# Кодеки сообщений
+# ===========================
+class Codec:
+    """Кодек тела сообщения. content_type записывается в BasicProperties, по нему консьюмер выбирает декодер."""
+    name = ''
+    content_type = ''
+    format = ''  # название формата для сообщений об ошибках
+
+    def encode(self, message):
+        raise NotImplementedError
+
+    def decode(self, body):
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    name = 'json'
+    content_type = 'application/json'
+    format = 'JSON'
+
+    def encode(self, message):
+        return json.dumps(message)
+
+    def decode(self, body):
+        return json.loads(body)
+
+
+class OrjsonCodec(Codec):
+    """JSON через orjson: тот же формат на проводе, быстрее кодирование и разбор."""
+    name = 'orjson'
+    content_type = 'application/json'
+    format = 'JSON'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def encode(self, message):
+        return self._orjson.dumps(message)
+
+    def decode(self, body):
+        return self._orjson.loads(body)
+
+
+class MsgpackCodec(Codec):
+    name = 'msgpack'
+    content_type = 'application/msgpack'
+    format = 'MessagePack'
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def encode(self, message):
+        return self._msgpack.packb(message, use_bin_type=True)
+
+    def decode(self, body):
+        return self._msgpack.unpackb(body, raw=False)
+
+
+class RawCodec(Codec):
+    """Без преобразования: bytes / bytearray / memoryview отправляются как есть, консьюмер получает bytes."""
+    name = 'raw'
+    content_type = 'application/octet-stream'
+    format = 'raw'
+
+    def encode(self, message):
+        if isinstance(message, str):
+            return message.encode()
+        return bytes(message)
+
+    def decode(self, body):
+        return body
+
+
+_factories = {codec.name: codec for codec in (JsonCodec, OrjsonCodec, MsgpackCodec, RawCodec)}
+_codecs = {}
+_content_types = {codec.content_type: codec.name for codec in (RawCodec, MsgpackCodec, JsonCodec)}
+
+
+def register_codec(codec, decode_content_type=True):
+    """
+    Регистрирует кодек по имени. decode_content_type=True — консьюмеры декодируют им сообщения с его content_type
+    (например, register_codec(OrjsonCodec()) переводит разбор application/json на orjson).
+    """
+    _codecs[codec.name] = codec
+    _factories[codec.name] = type(codec)
+    if decode_content_type:
+        _content_types[codec.content_type] = codec.name
+
+
+def get_codec(codec='json'):
+    """Кодек по имени или сам экземпляр Codec. Необязательные зависимости (orjson, msgpack) импортируются здесь."""
+    if isinstance(codec, Codec):
+        return codec
+    instance = _codecs.get(codec)
+    if instance is None:
+        factory = _factories.get(codec)
+        if factory is None:
+            raise ValueError(f"Unknown codec: {codec}")
+        instance = _codecs[codec] = factory()
+    return instance
+
+
+def codec_for_content_type(content_type, default=None):
+    """Декодер для content_type из свойств сообщения; для пустого или неизвестного — default."""
+    name = _content_types.get(content_type)
+    if name is None:
+        return default
+    return get_codec(name)
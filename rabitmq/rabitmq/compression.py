@@ -0,0 +1,40 @@
+import lzma
+import zlib
+
+# ===========================
+# Сжатие тела сообщения
+# ===========================
+# content_encoding -> (сжатие(body, level), распаковка(body))
+_ALGORITHMS = {
+    'zlib': (lambda body, level: zlib.compress(body, level), zlib.decompress),
+    'lzma': (lambda body, level: lzma.compress(body, preset=level), lzma.decompress),
+}
+_DEFAULT_LEVELS = {'zlib': 6, 'lzma': 1}
+
+
+def check_compression(compression):
+    if compression is not None and compression not in _ALGORITHMS:
+        raise ValueError(f"Unknown compression: {compression}")
+
+
+def compress(body, compression, threshold=1024, level=None):
+    """
+    Сжимает body, если задан алгоритм и размер не меньше threshold.
+    Возвращает (body, content_encoding); content_encoding=None — тело не сжато.
+    """
+    if compression is None or len(body) < threshold:
+        return body, None
+    if isinstance(body, str):
+        body = body.encode()
+    compressed = _ALGORITHMS[compression][0](body, _DEFAULT_LEVELS[compression] if level is None else level)
+    if len(compressed) >= len(body):
+        return body, None
+    return compressed, compression
+
+
+def decompress(body, content_encoding):
+    """Распаковывает body по content_encoding; тела с другими кодировками возвращаются без изменений."""
+    algorithm = _ALGORITHMS.get(content_encoding) if isinstance(content_encoding, str) else None
+    if algorithm is None:
+        return body
+    return algorithm[1](body)
@@ -0,0 +1,114 @@
+import pika
+import logging
+import asyncio
+from pika.adapters.asyncio_connection import AsyncioConnection
+
+# ===========================
+# Общие соединения для асинхронных Producer
+# ===========================
+class SharedConnection:
+    """
+    AsyncioConnection, по которому каналы открывают несколько producers.
+    Соединение открывается при первом запросе; после обрыва producers получают _connection_lost(),
+    а при переподключении каждый из них заново открывает канал и объявляет свою топологию.
+    """
+    def __init__(self, host='localhost', port=5672, heartbeat=600, logger=None):
+        self.host = host
+        self.port = port
+        self.heartbeat = heartbeat
+        self.connection = None
+        self.producers = set()
+        self._waiters = []  # (on_open, on_error), ожидающие открытия соединения
+        self._was_open = False
+        self.logger = logger or logging.getLogger(__name__)
+
+    @property
+    def refs(self):
+        return len(self.producers)
+
+    def open(self, on_open, on_error):
+        """Вызывает on_open(connection), когда соединение открыто, или on_error(error)."""
+        if self.connection is not None and self.connection.is_open:
+            on_open(self.connection)
+            return
+        self._waiters.append((on_open, on_error))
+        if self.connection is None:
+            self.connection = AsyncioConnection(
+                pika.ConnectionParameters(host=self.host, port=self.port, heartbeat=self.heartbeat),
+                on_open_callback=self._on_open,
+                on_open_error_callback=self._on_open_error,
+                on_close_callback=self._on_closed,
+                custom_ioloop=asyncio.get_running_loop(),
+            )
+
+    def _on_open(self, connection):
+        reconnected, self._was_open = self._was_open, True
+        self.logger.info(f"{'Reconnected' if reconnected else 'Connected'} to RabbitMQ {self.host}:{self.port}")
+        waiters, self._waiters = self._waiters, []
+        for on_open, on_error in waiters:
+            on_open(connection)
+        if reconnected:
+            for producer in list(self.producers):
+                producer._resume()
+
+    def _on_open_error(self, connection, error):
+        self.logger.error(f"RabbitMQ connection failed: {error}")
+        self.connection = None
+        self._fail(pika.exceptions.AMQPConnectionError(error))
+
+    def _on_closed(self, connection, reason):
+        self.connection = None
+        for producer in list(self.producers):
+            producer._connection_lost(reason)
+        self._fail(pika.exceptions.AMQPConnectionError(reason))
+
+    def _fail(self, error):
+        waiters, self._waiters = self._waiters, []
+        for on_open, on_error in waiters:
+            on_error(error)
+
+    def close(self):
+        connection, self.connection = self.connection, None
+        if connection is not None and not connection.is_closed and not connection.is_closing:
+            connection.close()
+            self.logger.info("RabbitMQ connection closed")
+
+
+class ConnectionManager:
+    """
+    Пул общих соединений процесса: не больше pool_size соединений на (host, port) в каждом цикле событий,
+    новый producer получает наименее загруженное. Соединение закрывается, когда его освобождает последний producer.
+    Consumers сюда не входят: их BlockingConnection обслуживается собственным потоком.
+    """
+    def __init__(self, pool_size=1, heartbeat=600, logger=None):
+        self.pool_size = max(1, pool_size)
+        self.heartbeat = heartbeat
+        self._pools = {}  # (host, port, loop) -> [SharedConnection]
+        self.logger = logger or logging.getLogger(__name__)
+
+    def acquire(self, producer):
+        loop = asyncio.get_running_loop()
+        for key in [key for key in self._pools if key[2].is_closed()]:
+            del self._pools[key]
+        pool = self._pools.setdefault((producer.host, producer.port, loop), [])
+        if len(pool) < self.pool_size:
+            shared = SharedConnection(producer.host, producer.port, self.heartbeat, self.logger)
+            pool.append(shared)
+        else:
+            shared = min(pool, key=lambda candidate: candidate.refs)
+        shared.producers.add(producer)
+        return shared
+
+    def release(self, producer, shared):
+        shared.producers.discard(producer)
+        if shared.refs:
+            return
+        for key, pool in list(self._pools.items()):
+            if shared in pool:
+                pool.remove(shared)
+                if not pool:
+                    del self._pools[key]
+        shared.close()
+
+
+default_connection_manager = ConnectionManager()
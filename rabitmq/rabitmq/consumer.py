@@ -1,18 +1,62 @@
 import pika
-import json
 import logging, time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from enum import Enum
+from functools import lru_cache, partial
 from threading import Thread
+from .codecs import get_codec, codec_for_content_type
+from .compression import decompress
+
+
+class NackPolicy(str, Enum):
+    REQUEUE = "requeue"  # сообщение возвращается в очередь
+    REQUEUE_ONCE = "requeue_once"  # возвращается один раз, повторная ошибка — отклонение без возврата
+    DROP = "drop"  # отклоняется без возврата (уходит в dead-letter exchange, если он настроен)
+
 
 # ===========================
 # Базовый класс Consumer
 # ===========================
 class BaseRabbitMQConsumer(Thread):
-    def __init__(self, host='localhost', port=5672, callback=None, auto_ack=True, logger=None):
+    def __init__(self, host='localhost', port=5672, callback=None, auto_ack=True, logger=None,
+                 prefetch_count=None, ack_batch_size=1, nack_policy=NackPolicy.REQUEUE_ONCE,
+                 executor=None, max_in_flight=None, ordered=False, order_key=None, codec='json'):
+        """
+        :param auto_ack: True — брокер считает сообщение доставленным сразу; False — подтверждение
+            после успешного callback, при ошибке — basic_nack по nack_policy
+        :param prefetch_count: максимум неподтверждённых сообщений у консьюмера (basic_qos)
+        :param ack_batch_size: подтверждать одним basic_ack(multiple=True) каждые N успешных сообщений
+            (не больше половины prefetch_count; остаток подтверждается при простое очереди)
+        :param executor: где выполнять callback — concurrent.futures.Executor (пул потоков или процессов)
+            или asyncio-цикл (тогда callback — корутинная функция). None — в потоке консьюмера
+        :param max_in_flight: максимум одновременно обрабатываемых сообщений (по умолчанию prefetch_count или 64)
+        :param ordered: сообщения с одинаковым order_key(method, properties, data) обрабатываются по порядку
+            (по умолчанию ключ — routing key)
+        :param codec: декодер для сообщений без content_type; сообщения с другим content_type
+            декодируются зарегистрированным для него кодеком
+        """
         super().__init__()
         self.host = host
         self.port = port
         self.callback = callback
         self.auto_ack = auto_ack
+        self.prefetch_count = prefetch_count
+        self.codec = get_codec(codec)
+        self.nack_policy = nack_policy
+        self.ack_batch_size = max(1, min(ack_batch_size, prefetch_count // 2) if prefetch_count else ack_batch_size)
+        self._pending_acks = 0
+        self._last_tag = None
+        self.executor = executor
+        self.max_in_flight = max_in_flight or prefetch_count or 64
+        self.ordered = ordered
+        self.order_key = order_key or (lambda method, properties, data: method.routing_key)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._outstanding = OrderedDict()  # delivery_tag -> None (обрабатывается) / True / False
+        self._chains = {}  # ключ порядка -> очередь сообщений, ждущих предыдущего
+        self._dispatch_lock = threading.Lock()
         self.connection = None
         self.channel = None
         self._is_interrupted = False
@@ -33,41 +77,170 @@ class BaseRabbitMQConsumer(Thread):
         ) 
         self.connection = pika.BlockingConnection(params) 
         self.channel = self.connection.channel()
+        self._pending_acks = 0
+        self._outstanding.clear()
+        if self.prefetch_count:
+            self.channel.basic_qos(prefetch_count=self.prefetch_count)
+
+    def _codec_for(self, properties):
+        content_type = getattr(properties, 'content_type', None)
+        if not content_type or content_type == self.codec.content_type:
+            return self.codec
+        return codec_for_content_type(content_type, self.codec)
+
+    def _ack(self, method):
+        if self.auto_ack:
+            return
+        self._last_tag = method.delivery_tag
+        self._pending_acks += 1
+        if self._pending_acks >= self.ack_batch_size:
+            self._flush_acks()
+
+    def _flush_acks(self):
+        if self._pending_acks and self.channel is not None and self.channel.is_open:
+            self.channel.basic_ack(delivery_tag=self._last_tag, multiple=True)
+        self._pending_acks = 0
+
+    def _submit(self, method, properties, data):
+        """Передаёт сообщение в executor, ожидая свободного места, пока обрабатывается max_in_flight сообщений."""
+        while not self._slots.acquire(timeout=0.05):
+            if self._is_interrupted:
+                return
+            self.connection.process_data_events(time_limit=0)  # heartbeat, пока ждём
+        if not self.auto_ack:
+            self._outstanding[method.delivery_tag] = None
+        job = (method, properties, data, self.channel)
+        key = None
+        if self.ordered:
+            key = self.order_key(method, properties, data)
+            with self._dispatch_lock:
+                chain = self._chains.get(key)
+                if chain is not None:
+                    chain.append(job)
+                    return
+                self._chains[key] = deque()
+        self._start(job, key)
+
+    def _callback_for(self, method):
+        """Обработчик сообщения для executor; None — сообщение подтверждается без обработки."""
+        return self.callback
+
+    def _start(self, job, key):
+        method, properties, data, channel = job
+        try:
+            callback = self._callback_for(method)
+            if callback is None:
+                future = Future()
+                future.set_result(None)
+            elif isinstance(self.executor, asyncio.AbstractEventLoop):
+                future = asyncio.run_coroutine_threadsafe(callback(method, properties, data), self.executor)
+            else:
+                # в пул процессов передаётся сам обработчик, а не метод консьюмера (поток не сериализуется)
+                future = self.executor.submit(callback, method, properties, data)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda done: self._finished(job, key, done))
+
+    def _finished(self, job, key, future):
+        """Вызывается в потоке executor: освобождает место и передаёт подтверждение в поток соединения."""
+        error = future.exception() if not future.cancelled() else asyncio.CancelledError()
+        self._slots.release()
+        if error is not None:
+            self.logger.error("Error in callback", exc_info=error)
+        else:
+            self.logger.debug(f"Consumed message: {job[2]}")
+        if not self.auto_ack:
+            try:
+                self.connection.add_callback_threadsafe(partial(self._settle, job, error is None))
+            except Exception:
+                pass  # соединение закрыто: неподтверждённое сообщение будет доставлено повторно
+        if key is not None:
+            with self._dispatch_lock:
+                chain = self._chains[key]
+                next_job = chain.popleft() if chain else None
+                if next_job is None:
+                    del self._chains[key]
+            if next_job is not None:
+                self._start(next_job, key)
+
+    def _settle(self, job, ok):
+        """В потоке соединения: подтверждает непрерывный префикс завершённых сообщений одним basic_ack."""
+        method, channel = job[0], job[3]
+        if channel is not self.channel or method.delivery_tag not in self._outstanding:
+            return  # канал сменился после переподключения, брокер доставит сообщение заново
+        if not ok:
+            self._nack(method)
+        self._outstanding[method.delivery_tag] = ok
+        while self._outstanding:
+            tag, done = next(iter(self._outstanding.items()))
+            if done is None:
+                break
+            del self._outstanding[tag]
+            if done:
+                self._last_tag = tag
+                self._pending_acks += 1
+        if self._pending_acks >= self.ack_batch_size:
+            self._flush_acks()
+
+    def _nack(self, method, requeue=None):
+        if self.auto_ack:
+            return
+        if requeue is None:
+            requeue = self.nack_policy == NackPolicy.REQUEUE or (
+                self.nack_policy == NackPolicy.REQUEUE_ONCE and not method.redelivered
+            )
+        self.channel.basic_nack(delivery_tag=method.delivery_tag, requeue=requeue)
 
     def run(self):
         raise NotImplementedError
 
 
 class QueueConsumer(BaseRabbitMQConsumer):
-    def __init__(self, host='localhost', port=5672, queue='default_queue', callback=None, auto_ack=True, logger=None):
-        super().__init__(host, port, callback, auto_ack, logger)
+    def __init__(self, host='localhost', port=5672, queue='default_queue', callback=None, auto_ack=True, logger=None, **kwargs):
+        super().__init__(host, port, callback, auto_ack, logger, **kwargs)
         self.queue = queue
 
+    def _declare_queue(self):
+        self.channel.queue_declare(queue=self.queue)
+        return self.queue
+
     def run(self):
         while not self._is_interrupted:
             try:
                 self._connect()
-                self.channel.queue_declare(queue=self.queue)
+                queue = self._declare_queue()
 
-                self.logger.info(f"Consuming queue '{self.queue}' on {self.host}:{self.port}")
-                for message in self.channel.consume(self.queue, inactivity_timeout=1, auto_ack=self.auto_ack):
+                self.logger.info(f"Consuming queue '{queue}' on {self.host}:{self.port}")
+                for message in self.channel.consume(queue, inactivity_timeout=1, auto_ack=self.auto_ack):
                     if self._is_interrupted:
                         break
                     if not all(message):
+                        self._flush_acks()
                         continue
                     method, properties, body = message
+                    codec = self._codec_for(properties)
                     try:
-                        data = json.loads(body)
+                        data = codec.decode(decompress(body, getattr(properties, 'content_encoding', None)))
                     except Exception: 
-                        self.logger.exception("Invalid JSON in message") 
+                        self.logger.exception(f"Invalid {codec.format} in message") 
+                        self._nack(method, requeue=False)
+                        continue
+
+                    if self.executor is not None and self.callback:
+                        self._submit(method, properties, data)
                         continue
 
                     try:
                         if self.callback:
                             self.callback(method, properties, data)
-                        self.logger.debug(f"Consumed message from '{self.queue}': {data}")
+                        self.logger.debug(f"Consumed message from '{queue}': {data}")
                     except Exception: 
                         self.logger.exception("Error in callback")
+                        self._nack(method)
+                    else:
+                        self._ack(method)
+                self._flush_acks()
             except pika.exceptions.AMQPError as e: 
                 self.logger.error(f"RabbitMQ channel error: {e}") 
                 time.sleep(5) 
@@ -82,9 +255,77 @@ class QueueConsumer(BaseRabbitMQConsumer):
                         pass
 
 
+def topic_matches(pattern, routing_key):
+    """Совпадение routing key с шаблоном topic exchange: '*' — ровно одно слово, '#' — ноль или больше слов."""
+    def match(pattern_words, key_words):
+        if not pattern_words:
+            return not key_words
+        head, rest = pattern_words[0], pattern_words[1:]
+        if head == '#':
+            return any(match(rest, key_words[i:]) for i in range(len(key_words) + 1))
+        if not key_words:
+            return False
+        return (head == '*' or head == key_words[0]) and match(rest, key_words[1:])
+
+    return match(pattern.split('.'), routing_key.split('.') if routing_key else [])
+
+
+class ExchangeConsumer(QueueConsumer):
+    """
+    Consumer topic- или direct-exchange: фильтрацию по routing key выполняет брокер.
+    Очередь привязывается к exchange по каждому ключу из bindings и routes.
+    routes — таблица маршрутизации {шаблон: обработчик(method, properties, data)}: сообщение получает первый
+    обработчик, чей шаблон совпал с routing key, остальные — callback (если задан).
+    queue='' — временная эксклюзивная очередь узла; имя — общая очередь, сообщения делятся между узлами.
+    route_cache_size — сколько последних routing key хранят найденный обработчик (LRU).
+    """
+    def __init__(self, host='localhost', port=5672, exchange='events', exchange_type='topic', bindings=None, routes=None,
+                 queue='', callback=None, auto_ack=True, logger=None, route_cache_size=1024, **kwargs):
+        super().__init__(host, port, queue, self._route, auto_ack, logger, **kwargs)
+        self.exchange = exchange
+        self.exchange_type = exchange_type
+        self.routes = list((routes or {}).items())
+        self.fallback = callback
+        self.binding_keys = list(dict.fromkeys(list(bindings or []) + [pattern for pattern, handler in self.routes]))
+        if not self.binding_keys:
+            self.binding_keys = ['#'] if exchange_type == 'topic' else ['']
+        self._handler_for = lru_cache(maxsize=route_cache_size)(self._match)  # routing key -> обработчик
+
+    def _declare_queue(self):
+        self.channel.exchange_declare(exchange=self.exchange, exchange_type=self.exchange_type)
+        if self.queue:
+            self.channel.queue_declare(queue=self.queue)
+            queue = self.queue
+        else:
+            queue = self.channel.queue_declare(queue='', exclusive=True).method.queue
+        for key in self.binding_keys:
+            self.channel.queue_bind(exchange=self.exchange, queue=queue, routing_key=key)
+        self.logger.info(f"Queue '{queue}' bound to {self.exchange_type} exchange '{self.exchange}': {self.binding_keys}")
+        return queue
+
+    def _match(self, routing_key):
+        for pattern, route in self.routes:
+            if pattern == routing_key or (self.exchange_type == 'topic' and topic_matches(pattern, routing_key)):
+                return route
+        return self.fallback
+
+    def _callback_for(self, method):
+        handler = self._handler_for(method.routing_key)
+        if handler is None:
+            self.logger.debug(f"No route for routing key '{method.routing_key}'")
+        return handler
+
+    def _route(self, method, properties, data):
+        handler = self._callback_for(method)
+        if handler is None:
+            return None
+        return handler(method, properties, data)
+
+
 class FanoutConsumer(BaseRabbitMQConsumer):
-    def __init__(self, host='localhost', port=5672, exchange='broadcast', callback=None, auto_ack=True, logger=None):
-        super().__init__(host, port, callback, auto_ack, logger)
+    def __init__(self, host='localhost', port=5672, exchange='broadcast', callback=None, auto_ack=True, logger=None, **kwargs):
+        super().__init__(host, port, callback, auto_ack, logger, **kwargs)
+        self.auto_ack = True  # временная эксклюзивная очередь всегда подтверждается брокером
         self.exchange = exchange
 
     def run(self):
@@ -104,7 +345,10 @@ class FanoutConsumer(BaseRabbitMQConsumer):
                         ch.stop_consuming()
                         return
                     try:
-                        data = json.loads(body)
+                        data = self._codec_for(properties).decode(decompress(body, getattr(properties, 'content_encoding', None)))
+                        if self.executor is not None and self.callback:
+                            self._submit(method, properties, data)
+                            return
                         if self.callback:
                             self.callback(method, properties, data)
                         self.logger.debug(f"Consumed message from fanout '{self.exchange}': {data}")
@@ -1,14 +1,23 @@
 import pika
-import json
 import logging
+from .codecs import get_codec
+from .compression import check_compression, compress
 
 # ===========================
 # Базовый класс Producer
 # ===========================
 class BaseRabbitMQProducer:
-    def __init__(self, host='localhost', port=5672, logger=None):
+    def __init__(self, host='localhost', port=5672, logger=None, codec='json', compression=None, compress_threshold=1024):
+        """
+        :param codec: имя зарегистрированного кодека (json, orjson, msgpack, raw) или экземпляр Codec
+        :param compression: 'zlib' или 'lzma' — сжимать тела от compress_threshold байт (content_encoding)
+        """
+        check_compression(compression)
         self.host = host
         self.port = port
+        self.codec = get_codec(codec)
+        self.compression = compression
+        self.compress_threshold = compress_threshold
         self.connection = None
         self.channel = None
         self.logger = logger or logging.getLogger(__name__)
@@ -20,6 +29,14 @@ class BaseRabbitMQProducer:
         self.channel = self.connection.channel()
         self.logger.info(f"Connected to RabbitMQ {self.host}:{self.port}")
 
+    def _prepare(self, message, properties):
+        """Кодирует и при необходимости сжимает сообщение. properties — кэш BasicProperties по content_encoding."""
+        body, encoding = compress(self.codec.encode(message), self.compression, self.compress_threshold)
+        if encoding not in properties:
+            extra = {'content_encoding': encoding} if encoding else {}
+            properties[encoding] = pika.BasicProperties(delivery_mode=2, content_type=self.codec.content_type, **extra)
+        return body, properties[encoding]
+
     def publish(self, message):
         raise NotImplementedError
 
@@ -30,8 +47,8 @@ class BaseRabbitMQProducer:
 
 
 class RabbitMQProducer(BaseRabbitMQProducer):
-    def __init__(self, host='localhost', port=5672, queue_name='default_queue', logger=None):
-        super().__init__(host, port, logger)
+    def __init__(self, host='localhost', port=5672, queue_name='default_queue', logger=None, codec='json', **kwargs):
+        super().__init__(host, port, logger, codec, **kwargs)
         self.queue_name = queue_name
 
     def connect(self):
@@ -42,18 +59,30 @@ class RabbitMQProducer(BaseRabbitMQProducer):
     def publish(self, message):
         if not self.connection or self.connection.is_closed:
             self.connect()
+        body, properties = self._prepare(message, {})
         self.channel.basic_publish(
             exchange='',
             routing_key=self.queue_name,
-            body=json.dumps(message),
-            properties=pika.BasicProperties(delivery_mode=2)
+            body=body,
+            properties=properties
         )
         self.logger.debug(f"Published message to queue '{self.queue_name}': {message}")
 
+    def publish_many(self, messages):
+        if not self.connection or self.connection.is_closed:
+            self.connect()
+        properties = {}
+        count = 0
+        for message in messages:
+            body, message_properties = self._prepare(message, properties)
+            self.channel.basic_publish(exchange='', routing_key=self.queue_name, body=body, properties=message_properties)
+            count += 1
+        self.logger.debug(f"Published {count} messages to queue '{self.queue_name}'")
+
 
 class RabbitMQProducerFanout(BaseRabbitMQProducer):
-    def __init__(self, host='localhost', port=5672, exchange_name='broadcast', logger=None):
-        super().__init__(host, port, logger)
+    def __init__(self, host='localhost', port=5672, exchange_name='broadcast', logger=None, codec='json', **kwargs):
+        super().__init__(host, port, logger, codec, **kwargs)
         self.exchange_name = exchange_name
 
     def connect(self):
@@ -64,11 +93,58 @@ class RabbitMQProducerFanout(BaseRabbitMQProducer):
     def publish(self, message):
         if not self.connection or self.connection.is_closed:
             self.connect()
+        body, properties = self._prepare(message, {})
         self.channel.basic_publish(
             exchange=self.exchange_name,
             routing_key='',
-            body=json.dumps(message),
-            properties=pika.BasicProperties(delivery_mode=2)
+            body=body,
+            properties=properties
         )
         self.logger.debug(f"Published message to fanout '{self.exchange_name}': {message}")
 
+    def publish_many(self, messages):
+        if not self.connection or self.connection.is_closed:
+            self.connect()
+        properties = {}
+        count = 0
+        for message in messages:
+            body, message_properties = self._prepare(message, properties)
+            self.channel.basic_publish(exchange=self.exchange_name, routing_key='', body=body, properties=message_properties)
+            count += 1
+        self.logger.debug(f"Published {count} messages to fanout '{self.exchange_name}'")
+
+
+class RabbitMQProducerExchange(BaseRabbitMQProducer):
+    """Публикация в topic- или direct-exchange с routing key: сообщение получают только подписанные на ключ очереди."""
+    def __init__(self, host='localhost', port=5672, exchange_name='events', exchange_type='topic', logger=None, codec='json', **kwargs):
+        super().__init__(host, port, logger, codec, **kwargs)
+        self.exchange_name = exchange_name
+        self.exchange_type = exchange_type
+
+    def connect(self):
+        super().connect()
+        self.channel.exchange_declare(exchange=self.exchange_name, exchange_type=self.exchange_type)
+        self.logger.info(f"{self.exchange_type.capitalize()} exchange '{self.exchange_name}' declared")
+
+    def publish(self, message, routing_key=''):
+        if not self.connection or self.connection.is_closed:
+            self.connect()
+        body, properties = self._prepare(message, {})
+        self.channel.basic_publish(
+            exchange=self.exchange_name,
+            routing_key=routing_key,
+            body=body,
+            properties=properties
+        )
+        self.logger.debug(f"Published message to '{self.exchange_name}' with key '{routing_key}': {message}")
+
+    def publish_many(self, messages, routing_key=''):
+        if not self.connection or self.connection.is_closed:
+            self.connect()
+        properties = {}
+        count = 0
+        for message in messages:
+            body, message_properties = self._prepare(message, properties)
+            self.channel.basic_publish(exchange=self.exchange_name, routing_key=routing_key, body=body, properties=message_properties)
+            count += 1
+        self.logger.debug(f"Published {count} messages to '{self.exchange_name}' with key '{routing_key}'")
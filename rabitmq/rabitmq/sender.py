@@ -1,5 +1,7 @@
-from .producer import RabbitMQProducerFanout
-from .producer import RabbitMQProducer
+import inspect
+from .async_producer import AsyncRabbitMQProducerFanout
+from .async_producer import AsyncRabbitMQProducer
+from .async_producer import AsyncRabbitMQProducerExchange
 
 class BaseSender:
     def __init__(self, logger, data_provider=None):
@@ -25,7 +27,12 @@ class BaseSender:
             if "data" not in kwargs:
                 raise ValueError("No data_provider and no 'data' in kwargs")
             data = kwargs["data"]
-        self.publisher.publish(data)
+        result = self._publish(data, kwargs)
+        if inspect.isawaitable(result):
+            await result
+
+    def _publish(self, data, kwargs):
+        return self.publisher.publish(data)
 
     def disconnect(self):
         if self.publisher:
@@ -37,11 +44,21 @@ class BaseSender:
 
 class QueueSender(BaseSender):
     """Отправка данных в конкретную очередь"""
-    def create_publisher(self, queue_name, host):
-        return RabbitMQProducer(host=host, queue_name=queue_name)
+    def create_publisher(self, queue_name, host, **kwargs):
+        return AsyncRabbitMQProducer(host=host, queue_name=queue_name, **kwargs)
 
 
 class FanoutSender(BaseSender):
     """Отправка данных в fanout exchange"""
-    def create_publisher(self, exchange_name, host):
-        return RabbitMQProducerFanout(host=host, exchange_name=exchange_name)
+    def create_publisher(self, exchange_name, host, **kwargs):
+        return AsyncRabbitMQProducerFanout(host=host, exchange_name=exchange_name, **kwargs)
+
+
+class ExchangeSender(BaseSender):
+    """Отправка данных в topic/direct exchange; routing key — из send(routing_key=...) или по умолчанию из connect()"""
+    def create_publisher(self, exchange_name, host, exchange_type='topic', routing_key='', **kwargs):
+        self.routing_key = routing_key
+        return AsyncRabbitMQProducerExchange(host=host, exchange_name=exchange_name, exchange_type=exchange_type, **kwargs)
+
+    def _publish(self, data, kwargs):
+        return self.publisher.publish(data, routing_key=kwargs.get("routing_key", self.routing_key))
@@ -0,0 +1,138 @@
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+_FLUSH = object()
+_STOP = object()
+
+
+class ProducerClosedError(Exception):
+    """publish() после close(): сообщение не будет отправлено"""
+
+# ===========================
+# Producer с собственным потоком ввода-вывода
+# ===========================
+class ThreadedRabbitMQProducer:
+    """
+    Обёртка над RabbitMQProducer / RabbitMQProducerFanout, которая владеет соединением в отдельном потоке.
+    publish() можно вызывать из любого потока: сообщение кладётся в ограниченный буфер,
+    а возвращаемый Future завершается после отправки (или с ошибкой отправки).
+    Пока буфер пуст, поток обслуживает heartbeat соединения.
+    """
+    def __init__(self, producer, max_buffer=10000, batch_size=100, idle_interval=1.0, logger=None):
+        self.producer = producer
+        self.batch_size = max(1, batch_size)
+        self.idle_interval = idle_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._thread = None
+        self._closing = False
+        self._start_lock = threading.Lock()
+        self._publish_lock = threading.Lock()  # проверка _closing и постановка в буфер атомарны относительно close()
+
+    def connect(self):
+        with self._start_lock:
+            self._closing = False
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="rabbitmq-publisher", daemon=True)
+                self._thread.start()
+
+    def publish(self, message):
+        """Не блокирует: при заполненном буфере выбрасывает queue.Full, после close() — ProducerClosedError."""
+        with self._publish_lock:
+            if self._closing:
+                raise ProducerClosedError("Producer is closed")
+            if self._thread is None:
+                self.connect()
+            future = Future()
+            self._queue.put_nowait((message, future))
+        return future
+
+    def flush(self, timeout=None):
+        """Ждёт отправки всех сообщений, переданных в publish() до вызова flush()."""
+        if self._thread is None:
+            return
+        marker = Future()
+        self._queue.put((_FLUSH, marker), timeout=timeout)
+        marker.result(timeout)
+
+    def close(self, timeout=None):
+        """
+        Отправляет сообщения, переданные в publish() до вызова close(), останавливает поток и закрывает соединение.
+        Futures сообщений, попавших в буфер позже, завершаются с ProducerClosedError.
+        """
+        with self._publish_lock:
+            self._closing = True
+            if self._thread is None:
+                return
+            self._queue.put((_STOP, None))
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self._fail_remaining([])  # например, flush(), вызванный одновременно с close()
+        self._thread = None
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    batch = [self._queue.get(timeout=self.idle_interval)]
+                except queue.Empty:
+                    self._heartbeat()
+                    continue
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                for index, (message, future) in enumerate(batch):
+                    if message is _STOP:
+                        self._fail_remaining(batch[index + 1:])
+                        return
+                    if message is _FLUSH:
+                        future.set_result(None)
+                    elif future.set_running_or_notify_cancel():
+                        self._send(message, future)
+        finally:
+            self.producer.close()
+
+    def _fail_remaining(self, batch):
+        # сообщения, добавленные одновременно с close(), не отправляются
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        error = ProducerClosedError("Producer closed before the message was sent")
+        for message, future in batch:
+            if future is not None and not future.done():
+                future.set_exception(error)
+
+    def _send(self, message, future):
+        for attempt in range(2):
+            try:
+                self.producer.publish(message)
+                future.set_result(None)
+                return
+            except Exception as e:
+                # при обрыве соединения publish() переподключается на следующей попытке
+                self.logger.warning(f"Background publish failed (attempt {attempt + 1}): {e}")
+                error = e
+                self._reset()
+        future.set_exception(error)
+
+    def _reset(self):
+        try:
+            self.producer.close()
+        except Exception:
+            pass
+        self.producer.connection = None
+
+    def _heartbeat(self):
+        connection = self.producer.connection
+        if connection is not None and connection.is_open:
+            try:
+                connection.process_data_events(time_limit=0)
+            except Exception as e:
+                self.logger.warning(f"RabbitMQ connection lost while idle: {e}")
+                self._reset()
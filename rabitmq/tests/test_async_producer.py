@@ -0,0 +1,162 @@
+import pytest
+import asyncio
+import json
+import pika
+from unittest.mock import Mock, patch
+
+from rabitmq.async_producer import AsyncRabbitMQProducer, AsyncRabbitMQProducerFanout, AsyncRabbitMQProducerExchange, PublishNackError
+
+
+def fake_connection(fail=False):
+    """Мок AsyncioConnection: вызывает колбэки открытия соединения и канала в цикле событий"""
+    channel = Mock()
+    channel.is_open = True
+    channel.queue_declare.side_effect = lambda queue, durable, callback: callback(Mock())
+    channel.exchange_declare.side_effect = lambda exchange, exchange_type, callback: callback(Mock())
+    channel.confirm_delivery.side_effect = lambda ack_nack_callback, callback: callback(Mock())
+    connection = Mock()
+    connection.is_open = True
+    connection.is_closed = False
+    connection.is_closing = False
+    connection.channel.side_effect = lambda on_open_callback: on_open_callback(channel)
+
+    def factory(params, on_open_callback, on_open_error_callback, on_close_callback, custom_ioloop):
+        if fail:
+            custom_ioloop.call_soon(on_open_error_callback, connection, "refused")
+        else:
+            custom_ioloop.call_soon(on_open_callback, connection)
+        return connection
+
+    return factory, connection, channel
+
+
+@pytest.mark.asyncio
+async def test_async_producer_connects_lazily_and_publishes():
+    log = Mock()
+    producer = AsyncRabbitMQProducer(host="localhost", queue_name="my_queue", logger=log)
+    factory, connection, channel = fake_connection()
+
+    with patch("rabitmq.connection.AsyncioConnection", side_effect=factory) as MockConn, \
+            patch("pika.BasicProperties") as MockProps:
+        producer.connect()
+        MockConn.assert_not_called()
+
+        await producer.publish({"foo": "bar"})
+        await producer.publish({"foo": "baz"})
+
+        MockConn.assert_called_once()
+        channel.queue_declare.assert_called_once()
+        log.info.assert_any_call("Queue 'my_queue' declared")
+        assert channel.basic_publish.call_count == 2
+        kwargs = channel.basic_publish.call_args_list[0].kwargs
+        assert kwargs["exchange"] == ''
+        assert kwargs["routing_key"] == "my_queue"
+        assert json.loads(kwargs["body"]) == {"foo": "bar"}
+        MockProps.assert_called_with(delivery_mode=2, content_type="application/json")
+
+        producer.close()
+        connection.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_async_fanout_producer_publishes_to_exchange():
+    producer = AsyncRabbitMQProducerFanout(host="localhost", exchange_name="broadcast", logger=Mock())
+    factory, connection, channel = fake_connection()
+
+    with patch("rabitmq.connection.AsyncioConnection", side_effect=factory):
+        await producer.publish({"hello": "world"})
+
+    channel.exchange_declare.assert_called_once()
+    kwargs = channel.basic_publish.call_args.kwargs
+    assert kwargs["exchange"] == "broadcast"
+    assert kwargs["routing_key"] == ''
+
+
+@pytest.mark.asyncio
+async def test_async_producer_connection_error_does_not_block():
+    producer = AsyncRabbitMQProducer(host="localhost", logger=Mock())
+    factory, connection, channel = fake_connection(fail=True)
+
+    with patch("rabitmq.connection.AsyncioConnection", side_effect=factory) as MockConn:
+        with pytest.raises(Exception, match="refused"):
+            await producer.publish({"foo": "bar"})
+        with pytest.raises(Exception, match="refused"):
+            await producer.publish({"foo": "bar"})
+
+    assert MockConn.call_count == 2  # каждая публикация после ошибки пробует подключиться заново
+    channel.basic_publish.assert_not_called()
+
+
+def confirm(producer, method):
+    producer.channel.confirm_delivery.call_args.args[0](Mock(method=method))
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_async_producer_confirm_window_and_nack_retry():
+    producer = AsyncRabbitMQProducer(host="localhost", queue_name="q", logger=Mock(), confirm_window=2, max_retries=1)
+    factory, connection, channel = fake_connection()
+
+    with patch("rabitmq.connection.AsyncioConnection", side_effect=factory):
+        task = asyncio.create_task(producer.publish_many([{"n": 1}, {"n": 2}, {"n": 3}]))
+        await settle()
+        assert channel.basic_publish.call_count == 2  # окно заполнено
+
+        confirm(producer, pika.spec.Basic.Ack(delivery_tag=2, multiple=True))
+        await settle()
+        assert channel.basic_publish.call_count == 3
+
+        confirm(producer, pika.spec.Basic.Nack(delivery_tag=3))
+        await settle()
+        assert channel.basic_publish.call_count == 4  # повтор отклонённого сообщения
+        assert json.loads(channel.basic_publish.call_args.kwargs["body"]) == {"n": 3}
+        assert not task.done()
+
+        confirm(producer, pika.spec.Basic.Ack(delivery_tag=4))
+        await asyncio.wait_for(task, 1)
+
+        publish = asyncio.create_task(producer.publish({"n": 4}))
+        await settle()
+        confirm(producer, pika.spec.Basic.Nack(delivery_tag=5))
+        await settle()
+        confirm(producer, pika.spec.Basic.Nack(delivery_tag=6))
+        with pytest.raises(PublishNackError):
+            await asyncio.wait_for(publish, 1)
+
+
+@pytest.mark.asyncio
+async def test_async_producer_batches_until_size_or_interval():
+    producer = AsyncRabbitMQProducer(host="localhost", queue_name="q", logger=Mock(), batch_size=3, flush_interval=0.01)
+    factory, connection, channel = fake_connection()
+
+    with patch("rabitmq.connection.AsyncioConnection", side_effect=factory):
+        first = asyncio.create_task(producer.publish({"n": 1}))
+        await settle()
+        channel.basic_publish.assert_not_called()
+
+        await producer.publish_many([{"n": 2}, {"n": 3}])  # буфер заполнен — отправка сразу
+        await first
+        assert channel.basic_publish.call_count == 3
+
+        await asyncio.wait_for(producer.publish({"n": 4}), 1)  # отправка по таймеру
+        assert channel.basic_publish.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_async_exchange_producer_routing_keys():
+    producer = AsyncRabbitMQProducerExchange(exchange_name="events", logger=Mock(), shared_connection=False)
+    factory, connection, channel = fake_connection()
+
+    with patch("rabitmq.connection.AsyncioConnection", side_effect=factory):
+        await producer.publish({"n": 1}, routing_key="device.lamp.state")
+        await producer.publish_many([{"n": 2}, {"n": 3}], routing_key="system.boot")
+
+    channel.exchange_declare.assert_called_once()
+    assert channel.exchange_declare.call_args.kwargs["exchange_type"] == "topic"
+    keys = [call.kwargs["routing_key"] for call in channel.basic_publish.call_args_list]
+    assert keys == ["device.lamp.state", "system.boot", "system.boot"]
+
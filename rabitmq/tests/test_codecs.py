@@ -0,0 +1,62 @@
+import pytest
+import json
+from unittest.mock import MagicMock, Mock, patch
+
+from rabitmq.codecs import get_codec, codec_for_content_type, JsonCodec, RawCodec
+from rabitmq.consumer import QueueConsumer
+from rabitmq.producer import RabbitMQProducer
+
+
+@pytest.mark.parametrize("name", ["json", "orjson", "msgpack"])
+def test_codec_roundtrip(name):
+    if name != "json":
+        pytest.importorskip(name)
+    codec = get_codec(name)
+    message = {"device": "lamp", "values": [1, 2.5, None], "on": True}
+    assert codec.decode(codec.encode(message)) == message
+
+
+def test_raw_codec_passthrough():
+    codec = get_codec("raw")
+    assert codec.encode(memoryview(b"abc")) == b"abc"
+    assert codec.decode(b"abc") == b"abc"
+
+
+def test_codec_lookup():
+    assert isinstance(get_codec("json"), JsonCodec)
+    assert codec_for_content_type("application/octet-stream").__class__ is RawCodec
+    assert codec_for_content_type("text/unknown", default="fallback") == "fallback"
+    with pytest.raises(ValueError, match="Unknown codec"):
+        get_codec("yaml")
+
+
+def test_producer_stamps_content_type():
+    producer = RabbitMQProducer(queue_name="q", logger=Mock(), codec="raw")
+
+    with patch("pika.BlockingConnection") as MockConn, patch("pika.BasicProperties") as MockProps:
+        channel = MockConn.return_value.channel.return_value
+        MockConn.return_value.is_closed = False
+        producer.publish(bytearray(b"\x00\x01"))
+
+    MockProps.assert_called_once_with(delivery_mode=2, content_type="application/octet-stream")
+    assert channel.basic_publish.call_args.kwargs["body"] == b"\x00\x01"
+
+
+def test_consumer_decodes_by_content_type():
+    received = []
+    consumer = QueueConsumer(queue="q", callback=lambda method, properties, data: received.append(data), logger=Mock())
+    channel = MagicMock()
+
+    def deliveries(*args, **kwargs):
+        yield (Mock(), Mock(content_type="application/json"), json.dumps({"n": 1}).encode())
+        yield (Mock(), Mock(content_type="application/octet-stream"), b"\xff\xfe")
+        yield (Mock(), Mock(content_type=None), b'{"n": 2}')  # старые producers без content_type
+        consumer._is_interrupted = True
+        yield (None, None, None)
+
+    channel.consume.side_effect = deliveries
+    with patch("pika.BlockingConnection") as MockConn:
+        MockConn.return_value.channel.return_value = channel
+        consumer.run()
+
+    assert received == [{"n": 1}, b"\xff\xfe", {"n": 2}]
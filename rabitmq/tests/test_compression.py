@@ -0,0 +1,59 @@
+import pytest
+import json
+from unittest.mock import Mock, patch
+
+from rabitmq.compression import compress, decompress
+from rabitmq.consumer import FanoutConsumer
+from rabitmq.producer import RabbitMQProducerFanout
+
+SNAPSHOT = {"devices": [{"id": n, "state": "on", "values": list(range(20))} for n in range(100)]}
+
+
+@pytest.mark.parametrize("compression", ["zlib", "lzma"])
+def test_compress_roundtrip_above_threshold(compression):
+    body = json.dumps(SNAPSHOT)
+    compressed, encoding = compress(body, compression, threshold=1024)
+    assert encoding == compression
+    assert len(compressed) < len(body) / 5
+    assert json.loads(decompress(compressed, encoding)) == SNAPSHOT
+
+
+def test_compress_skips_small_and_unknown():
+    assert compress('{"a": 1}', "zlib", threshold=1024) == ('{"a": 1}', None)
+    assert compress('{"a": 1}', None, threshold=0) == ('{"a": 1}', None)
+    assert decompress(b"raw", "identity") == b"raw"
+    assert decompress(b"raw", None) == b"raw"
+    with pytest.raises(ValueError, match="Unknown compression"):
+        RabbitMQProducerFanout(compression="brotli")
+
+
+def test_fanout_producer_and_consumer_compression():
+    producer = RabbitMQProducerFanout(exchange_name="state", logger=Mock(), compression="zlib")
+
+    with patch("pika.BlockingConnection") as MockConn, patch("pika.BasicProperties") as MockProps:
+        channel = MockConn.return_value.channel.return_value
+        MockConn.return_value.is_closed = False
+        producer.publish(SNAPSHOT)
+        producer.publish({"small": True})
+
+    assert MockProps.call_args_list[0].kwargs == {"delivery_mode": 2, "content_type": "application/json", "content_encoding": "zlib"}
+    assert MockProps.call_args_list[1].kwargs == {"delivery_mode": 2, "content_type": "application/json"}
+    bodies = [call.kwargs["body"] for call in channel.basic_publish.call_args_list]
+
+    received = []
+    consumer = FanoutConsumer(exchange="state", callback=lambda method, properties, data: received.append(data), logger=Mock())
+    consumer._connect = Mock()
+    consumer.channel = Mock()
+    consumer.channel.queue_declare.return_value.method.queue = "tmp"
+    captured = {}
+    consumer.channel.basic_consume = lambda queue, on_message_callback, auto_ack: captured.setdefault("cb", on_message_callback)
+
+    def fake_start_consuming():
+        captured["cb"](consumer.channel, Mock(), Mock(content_type="application/json", content_encoding="zlib"), bodies[0])
+        captured["cb"](consumer.channel, Mock(), Mock(content_type="application/json", content_encoding=None), bodies[1])
+        consumer._is_interrupted = True
+
+    consumer.channel.start_consuming = fake_start_consuming
+    consumer.run()
+
+    assert received == [SNAPSHOT, {"small": True}]
@@ -0,0 +1,76 @@
+import pytest
+import asyncio
+from unittest.mock import Mock, patch
+
+from rabitmq.async_producer import AsyncRabbitMQProducer, AsyncRabbitMQProducerFanout
+from rabitmq.connection import ConnectionManager
+from tests.test_async_producer import fake_connection
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_producers_share_connection_until_last_release():
+    manager = ConnectionManager()
+    factory, connection, channel = fake_connection()
+    queue = AsyncRabbitMQProducer(queue_name="q", logger=Mock(), connection_manager=manager)
+    fanout = AsyncRabbitMQProducerFanout(exchange_name="ex", logger=Mock(), connection_manager=manager)
+    other_host = AsyncRabbitMQProducer(host="other", queue_name="q", logger=Mock(), connection_manager=manager)
+
+    with patch("rabitmq.connection.AsyncioConnection", side_effect=factory) as MockConn:
+        await queue.publish({"n": 1})
+        await fanout.publish({"n": 2})
+        assert MockConn.call_count == 1
+        assert connection.channel.call_count == 2
+
+        await other_host.publish({"n": 3})
+        assert MockConn.call_count == 2
+
+    queue.close()
+    connection.close.assert_not_called()
+    fanout.close()
+    other_host.close()
+    assert connection.close.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_reconnect_redeclares_topology_for_every_producer():
+    manager = ConnectionManager()
+    factory, connection, channel = fake_connection()
+    queue = AsyncRabbitMQProducer(queue_name="q", logger=Mock(), connection_manager=manager)
+    fanout = AsyncRabbitMQProducerFanout(exchange_name="ex", logger=Mock(), connection_manager=manager)
+
+    with patch("rabitmq.connection.AsyncioConnection", side_effect=factory) as MockConn:
+        await queue.publish({"n": 1})
+        await fanout.publish({"n": 2})
+
+        # обрыв соединения
+        on_close = MockConn.call_args.kwargs["on_close_callback"]
+        on_close(connection, "broker restarted")
+        assert queue.channel is None and fanout.channel is None
+
+        await queue.publish({"n": 3})
+        await settle()
+
+    assert MockConn.call_count == 2
+    assert channel.queue_declare.call_count == 2
+    assert channel.exchange_declare.call_count == 2  # fanout переобъявил exchange без собственной публикации
+    assert fanout.channel is channel
+
+
+@pytest.mark.asyncio
+async def test_dedicated_connection():
+    factory, connection, channel = fake_connection()
+    first = AsyncRabbitMQProducer(queue_name="q", logger=Mock(), shared_connection=False)
+    second = AsyncRabbitMQProducer(queue_name="q", logger=Mock(), shared_connection=False)
+
+    with patch("rabitmq.connection.AsyncioConnection", side_effect=factory) as MockConn:
+        await first.publish({"n": 1})
+        await second.publish({"n": 2})
+
+    assert MockConn.call_count == 2
+    first.close()
+    connection.close.assert_called_once()
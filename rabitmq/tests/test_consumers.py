@@ -1,7 +1,7 @@
 import pytest
 import json
 import pika
-from unittest.mock import MagicMock, patch, Mock
+from unittest.mock import MagicMock, patch, Mock, call
 from rabitmq.consumer import BaseRabbitMQConsumer, QueueConsumer, FanoutConsumer 
 # ===============================
 # BaseRabbitMQConsumer
@@ -102,6 +102,150 @@ class TestQueueConsumer:
         consumer.logger.exception.assert_any_call("Invalid JSON in message")
 
 
+    def test_queue_consumer_manual_ack_batches_and_nack_policy(self):
+        from rabitmq.consumer import NackPolicy
+        fail = {3, 4}
+
+        def callback(method, properties, data):
+            if method.delivery_tag in fail:
+                raise ValueError("boom")
+
+        consumer = QueueConsumer(queue="q", callback=callback, auto_ack=False, logger=Mock(),
+                                 prefetch_count=10, ack_batch_size=2, nack_policy=NackPolicy.REQUEUE_ONCE)
+        channel = MagicMock()
+        channel.is_open = True
+
+        def message(tag, redelivered=False):
+            return (Mock(delivery_tag=tag, redelivered=redelivered), Mock(), json.dumps({"n": tag}).encode())
+
+        def stop_on_idle():
+            yield from [message(1), message(2), message(3), message(4, redelivered=True), message(5)]
+            yield (None, None, None)  # простой — подтверждаем остаток
+            consumer._is_interrupted = True
+            yield (None, None, None)
+
+        channel.consume.side_effect = lambda *args, **kwargs: stop_on_idle()
+
+        with patch("pika.BlockingConnection") as MockConn:
+            MockConn.return_value.channel.return_value = channel
+            consumer.run()
+
+        channel.basic_qos.assert_called_once_with(prefetch_count=10)
+        assert channel.consume.call_args.kwargs["auto_ack"] is False
+        assert channel.basic_ack.call_args_list == [
+            call(delivery_tag=2, multiple=True),
+            call(delivery_tag=5, multiple=True),
+        ]
+        assert channel.basic_nack.call_args_list == [
+            call(delivery_tag=3, requeue=True),
+            call(delivery_tag=4, requeue=False),
+        ]
+
+
+    def _run_with_threadsafe_callbacks(self, consumer, messages, until):
+        """Имитирует BlockingConnection: колбэки add_callback_threadsafe выполняются в потоке консьюмера"""
+        import time
+        pending = []
+        channel = MagicMock()
+        channel.is_open = True
+        connection = MagicMock()
+        connection.is_open = True
+        connection.add_callback_threadsafe.side_effect = pending.append
+        connection.channel.return_value = channel
+
+        def deliveries():
+            yield from messages
+            deadline = time.monotonic() + 2
+            while not until() and time.monotonic() < deadline:
+                while pending:
+                    pending.pop(0)()
+                yield (None, None, None)
+                time.sleep(0.005)
+            consumer._is_interrupted = True
+            yield (None, None, None)
+
+        channel.consume.side_effect = lambda *args, **kwargs: deliveries()
+        with patch("pika.BlockingConnection", return_value=connection):
+            consumer.run()
+        return channel
+
+    def test_queue_consumer_executor_acks_contiguous_prefix(self):
+        from concurrent.futures import ThreadPoolExecutor
+        import time
+        done = []
+
+        def callback(method, properties, data):
+            if method.delivery_tag == 1:
+                time.sleep(0.05)
+            done.append(method.delivery_tag)
+            if method.delivery_tag == 3:
+                raise ValueError("boom")
+
+        def message(tag):
+            return (Mock(delivery_tag=tag, redelivered=False, routing_key="q"), Mock(), json.dumps({"n": tag}).encode())
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            consumer = QueueConsumer(queue="q", callback=callback, auto_ack=False, logger=Mock(),
+                                     prefetch_count=3, executor=executor)
+            channel = self._run_with_threadsafe_callbacks(
+                consumer, [message(1), message(2), message(3)],
+                until=lambda: consumer.channel.basic_ack.called,
+            )
+
+        assert done[-1] == 1  # первое сообщение завершилось последним
+        channel.basic_nack.assert_called_once_with(delivery_tag=3, requeue=True)
+        assert channel.basic_ack.call_args_list == [call(delivery_tag=2, multiple=True)]
+
+    def test_queue_consumer_ordered_dispatch(self):
+        from concurrent.futures import ThreadPoolExecutor
+        import threading, time
+        lock = threading.Lock()
+        active = {}
+        overlap = []
+        order = {}
+
+        def callback(method, properties, data):
+            key = method.routing_key
+            with lock:
+                active[key] = active.get(key, 0) + 1
+                overlap.append(active[key] > 1)
+            time.sleep(0.01)
+            with lock:
+                active[key] -= 1
+                order.setdefault(key, []).append(data["n"])
+
+        messages = [
+            (Mock(delivery_tag=n, redelivered=False, routing_key="ab"[n % 2]), Mock(), json.dumps({"n": n}).encode())
+            for n in range(1, 9)
+        ]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            consumer = QueueConsumer(queue="q", callback=callback, logger=Mock(), executor=executor, ordered=True)
+            self._run_with_threadsafe_callbacks(consumer, messages, until=lambda: sum(map(len, order.values())) == 8)
+
+        assert not any(overlap)
+        assert order == {"a": [2, 4, 6, 8], "b": [1, 3, 5, 7]}
+
+    def test_queue_consumer_asyncio_loop_dispatch(self):
+        import asyncio, threading
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        received = []
+
+        async def callback(method, properties, data):
+            await asyncio.sleep(0)
+            received.append(data["n"])
+
+        messages = [(Mock(delivery_tag=n, redelivered=False, routing_key="q"), Mock(), json.dumps({"n": n}).encode()) for n in (1, 2)]
+        consumer = QueueConsumer(queue="q", callback=callback, auto_ack=False, logger=Mock(), executor=loop)
+        channel = self._run_with_threadsafe_callbacks(consumer, messages, until=lambda: consumer.channel.basic_ack.called and not consumer._outstanding)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(1)
+
+        assert sorted(received) == [1, 2]
+        assert channel.basic_ack.call_args_list[-1] == call(delivery_tag=2, multiple=True)
+
+
 # ===============================
 # FanoutConsumer
 # ===============================
@@ -165,3 +309,108 @@ class TestFanoutConsumer:
         consumer.run()
 
         mock_logger.exception.assert_any_call("Error processing fanout message")
+
+
+# ===============================
+# ExchangeConsumer
+# ===============================
+
+@pytest.mark.parametrize("pattern, key, expected", [
+    ("device.*.state", "device.lamp.state", True),
+    ("device.*.state", "device.lamp.power.state", False),
+    ("device.#", "device", True),
+    ("device.#", "device.lamp.state", True),
+    ("#.state", "device.lamp.state", True),
+    ("*.lamp.#", "device.fan.state", False),
+    ("#", "", True),
+])
+def test_topic_matches(pattern, key, expected):
+    from rabitmq.consumer import topic_matches
+    assert topic_matches(pattern, key) is expected
+
+
+def _route_in_process(method, properties, data):
+    # обработчик для пула процессов должен сериализоваться pickle, поэтому объявлен на уровне модуля
+    if data["n"] == 2:
+        raise ValueError("boom")
+
+
+class TestExchangeConsumer:
+    def test_exchange_consumer_binds_and_routes(self):
+        from rabitmq.consumer import ExchangeConsumer
+        states, alerts, other = [], [], []
+        consumer = ExchangeConsumer(
+            exchange="events",
+            bindings=["system.#"],
+            routes={
+                "device.*.state": lambda method, properties, data: states.append(data),
+                "device.#": lambda method, properties, data: alerts.append(data),
+            },
+            callback=lambda method, properties, data: other.append(data),
+            logger=Mock(),
+        )
+        channel = MagicMock()
+        channel.queue_declare.return_value.method.queue = "amq.gen-1"
+
+        def deliveries(*args, **kwargs):
+            for n, key in enumerate(["device.lamp.state", "device.lamp.alert", "system.boot", "device.fan.state"]):
+                yield (Mock(routing_key=key), Mock(content_type=None), json.dumps({"n": n}).encode())
+            consumer._is_interrupted = True
+            yield (None, None, None)
+
+        channel.consume.side_effect = deliveries
+        with patch("pika.BlockingConnection") as MockConn:
+            MockConn.return_value.channel.return_value = channel
+            consumer.run()
+
+        channel.exchange_declare.assert_called_once_with(exchange="events", exchange_type="topic")
+        channel.queue_declare.assert_called_once_with(queue="", exclusive=True)
+        assert [c.kwargs["routing_key"] for c in channel.queue_bind.call_args_list] == ["system.#", "device.*.state", "device.#"]
+        assert channel.consume.call_args.args[0] == "amq.gen-1"
+        assert states == [{"n": 0}, {"n": 3}]
+        assert alerts == [{"n": 1}]
+        assert other == [{"n": 2}]
+
+    def test_direct_exchange_shared_queue(self):
+        from rabitmq.consumer import ExchangeConsumer
+        consumer = ExchangeConsumer(exchange="commands", exchange_type="direct", queue="workers",
+                                    routes={"reboot": Mock()}, logger=Mock())
+        consumer.channel = MagicMock()
+
+        assert consumer._declare_queue() == "workers"
+        consumer.channel.queue_declare.assert_called_once_with(queue="workers")
+        consumer.channel.queue_bind.assert_called_once_with(exchange="commands", queue="workers", routing_key="reboot")
+        assert consumer._handler_for("reboot.now") is None  # direct — только точное совпадение
+
+
+    def test_exchange_consumer_route_cache_is_bounded(self):
+        from rabitmq.consumer import ExchangeConsumer
+        handler = Mock()
+        consumer = ExchangeConsumer(routes={"device.#": handler}, logger=Mock(), route_cache_size=4)
+
+        for n in range(100):
+            assert consumer._handler_for(f"device.{n}.state") is handler
+        assert consumer._handler_for("system.boot") is None
+
+        info = consumer._handler_for.cache_info()
+        assert info.currsize == 4
+        assert info.maxsize == 4
+
+    def test_exchange_consumer_process_pool(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from rabitmq.consumer import ExchangeConsumer
+
+        messages = [
+            (pika.spec.Basic.Deliver(delivery_tag=n, routing_key=key), pika.BasicProperties(), json.dumps({"n": n}).encode())
+            for n, key in [(1, "device.lamp.state"), (2, "device.fan.state"), (3, "system.boot")]
+        ]
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            consumer = ExchangeConsumer(routes={"device.#": _route_in_process}, auto_ack=False, logger=Mock(),
+                                        prefetch_count=3, executor=executor)
+            channel = TestQueueConsumer()._run_with_threadsafe_callbacks(
+                consumer, messages,
+                until=lambda: not consumer._outstanding and consumer.channel.basic_nack.called,
+            )
+
+        channel.basic_nack.assert_called_once_with(delivery_tag=2, requeue=True)
+        assert channel.basic_ack.call_args_list[-1] == call(delivery_tag=3, multiple=True)
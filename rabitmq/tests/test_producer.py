@@ -3,7 +3,7 @@ from unittest.mock import Mock, patch
 import json
 import pika
 
-from rabitmq.producer import BaseRabbitMQProducer, RabbitMQProducer, RabbitMQProducerFanout
+from rabitmq.producer import BaseRabbitMQProducer, RabbitMQProducer, RabbitMQProducerFanout, RabbitMQProducerExchange
 
 # -------------------------------
 # BaseRabbitMQProducer
@@ -56,7 +56,7 @@ def test_rabbitmq_producer_connect_and_publish():
         assert json.loads(kwargs["body"]) == msg
 
         # Проверка properties через мок
-        MockProps.assert_called_once_with(delivery_mode=2)
+        MockProps.assert_called_once_with(delivery_mode=2, content_type="application/json")
         assert kwargs["properties"] == MockProps.return_value
 
 
@@ -91,5 +91,41 @@ def test_rabbitmq_producer_fanout_connect_and_publish():
         assert json.loads(kwargs["body"]) == msg
 
         # Проверка, что BasicProperties был вызван и передан
-        MockProps.assert_called_once_with(delivery_mode=2)
-        assert kwargs["properties"] == MockProps.return_value
\ No newline at end of file
+        MockProps.assert_called_once_with(delivery_mode=2, content_type="application/json")
+        assert kwargs["properties"] == MockProps.return_value
+
+
+def test_rabbitmq_producer_publish_many():
+    producer = RabbitMQProducer(host="localhost", queue_name="my_queue", logger=Mock())
+
+    with patch("pika.BlockingConnection") as MockConn, patch("pika.BasicProperties") as MockProps:
+        mock_channel = Mock()
+        MockConn.return_value.channel.return_value = mock_channel
+        MockConn.return_value.is_closed = False
+
+        producer.publish_many([{"n": 1}, {"n": 2}])
+
+        MockConn.assert_called_once()
+        MockProps.assert_called_once_with(delivery_mode=2, content_type="application/json")
+        bodies = [json.loads(call.kwargs["body"]) for call in mock_channel.basic_publish.call_args_list]
+        assert bodies == [{"n": 1}, {"n": 2}]
+
+
+def test_rabbitmq_producer_exchange_publishes_with_routing_key():
+    log = Mock()
+    producer = RabbitMQProducerExchange(host="localhost", exchange_name="events", exchange_type="direct", logger=log)
+
+    with patch("pika.BlockingConnection") as MockConn, patch("pika.BasicProperties"):
+        mock_channel = Mock()
+        MockConn.return_value.channel.return_value = mock_channel
+        MockConn.return_value.is_closed = False
+
+        producer.publish({"state": "on"}, routing_key="device.lamp")
+        producer.publish_many([{"n": 1}], routing_key="device.fan")
+
+        mock_channel.exchange_declare.assert_called_once_with(exchange="events", exchange_type="direct")
+        log.info.assert_any_call("Direct exchange 'events' declared")
+        keys = [call.kwargs["routing_key"] for call in mock_channel.basic_publish.call_args_list]
+        assert keys == ["device.lamp", "device.fan"]
+        assert mock_channel.basic_publish.call_args.kwargs["exchange"] == "events"
+
@@ -2,7 +2,7 @@ import pytest
 import asyncio
 from unittest.mock import AsyncMock, Mock, patch
 
-from rabitmq.sender import BaseSender, QueueSender, FanoutSender
+from rabitmq.sender import BaseSender, QueueSender, FanoutSender, ExchangeSender
 
 @pytest.mark.asyncio
 async def test_base_sender_send_with_data_provider():
@@ -39,6 +39,23 @@ async def test_base_sender_send_with_direct_data():
     
     publisher.publish.assert_called_once_with("direct_data")
 
+@pytest.mark.asyncio
+async def test_base_sender_awaits_async_publisher():
+    log = Mock()
+    publisher = Mock()
+    publisher.publish = AsyncMock()
+
+    class TestSender(BaseSender):
+        def create_publisher(self, *args, **kwargs):
+            return publisher
+
+    sender = TestSender(logger=log)
+    sender.connect()
+
+    await sender.send(data="direct_data")
+
+    publisher.publish.assert_awaited_once_with("direct_data")
+
 @pytest.mark.asyncio
 async def test_base_sender_send_without_data_raises():
     log = Mock()
@@ -70,7 +87,7 @@ def test_base_sender_connect_and_disconnect():
 
 def test_queue_sender_create_publisher():
     log = Mock()
-    with patch("rabitmq.sender.RabbitMQProducer") as MockProducer:
+    with patch("rabitmq.sender.AsyncRabbitMQProducer") as MockProducer:
         sender = QueueSender(logger=log)
         pub = sender.create_publisher(queue_name="q1", host="localhost")
         MockProducer.assert_called_once_with(host="localhost", queue_name="q1")
@@ -78,8 +95,25 @@ def test_queue_sender_create_publisher():
 
 def test_fanout_sender_create_publisher():
     log = Mock()
-    with patch("rabitmq.sender.RabbitMQProducerFanout") as MockProducer:
+    with patch("rabitmq.sender.AsyncRabbitMQProducerFanout") as MockProducer:
         sender = FanoutSender(logger=log)
         pub = sender.create_publisher(exchange_name="ex1", host="localhost")
         MockProducer.assert_called_once_with(host="localhost", exchange_name="ex1")
         assert pub == MockProducer.return_value
+
+@pytest.mark.asyncio
+async def test_exchange_sender_routing_key():
+    log = Mock()
+    with patch("rabitmq.sender.AsyncRabbitMQProducerExchange") as MockProducer:
+        MockProducer.return_value.publish = AsyncMock()
+        sender = ExchangeSender(logger=log)
+        sender.connect(exchange_name="events", host="localhost", routing_key="device.default")
+        MockProducer.assert_called_once_with(host="localhost", exchange_name="events", exchange_type="topic")
+
+        await sender.send(data={"a": 1})
+        await sender.send(data={"a": 2}, routing_key="device.lamp.state")
+
+        publish = MockProducer.return_value.publish
+        assert publish.await_args_list[0].kwargs == {"routing_key": "device.default"}
+        assert publish.await_args_list[1].kwargs == {"routing_key": "device.lamp.state"}
+
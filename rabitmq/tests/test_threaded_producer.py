@@ -0,0 +1,122 @@
+import pytest
+import queue
+import threading
+from unittest.mock import Mock
+
+from rabitmq.threaded_producer import ThreadedRabbitMQProducer
+
+
+def make_producer():
+    producer = Mock()
+    producer.connection = None
+    producer.threads = set()
+    producer.publish.side_effect = lambda message: producer.threads.add(threading.current_thread().name)
+    return producer
+
+
+def test_threaded_producer_publishes_from_many_threads():
+    producer = make_producer()
+    publisher = ThreadedRabbitMQProducer(producer, logger=Mock())
+    futures = []
+
+    def worker(n):
+        for i in range(50):
+            futures.append(publisher.publish({"n": n, "i": i}))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    publisher.flush(timeout=2)
+
+    assert all(future.done() and future.exception() is None for future in futures)
+    assert producer.publish.call_count == 200
+    assert producer.threads == {"rabbitmq-publisher"}  # соединением пользуется только поток публикации
+
+    publisher.close(timeout=2)
+    producer.close.assert_called()
+
+
+def test_threaded_producer_retries_once_and_reports_error():
+    producer = make_producer()
+    producer.publish.side_effect = [ConnectionError("lost"), None, ConnectionError("lost"), ConnectionError("still down")]
+    publisher = ThreadedRabbitMQProducer(producer, logger=Mock())
+
+    first = publisher.publish({"n": 1})
+    assert first.result(timeout=2) is None  # повтор после переподключения
+    second = publisher.publish({"n": 2})
+    with pytest.raises(ConnectionError, match="still down"):
+        second.result(timeout=2)
+    publisher.close(timeout=2)
+
+
+def test_threaded_producer_bounded_buffer():
+    producer = make_producer()
+    blocker = threading.Event()
+    producer.publish.side_effect = lambda message: blocker.wait(2)
+    publisher = ThreadedRabbitMQProducer(producer, max_buffer=2, batch_size=1, logger=Mock())
+
+    publisher.publish({"n": 0})  # занимает поток публикации
+    while not publisher._queue.empty():
+        pass
+    publisher.publish({"n": 1})
+    publisher.publish({"n": 2})
+    with pytest.raises(queue.Full):
+        publisher.publish({"n": 3})
+
+    blocker.set()
+    publisher.close(timeout=2)
+    assert producer.publish.call_count == 3
+
+
+def test_threaded_producer_close_fails_late_messages():
+    from concurrent.futures import Future
+    from rabitmq.threaded_producer import ProducerClosedError
+
+    producer = make_producer()
+    blocker = threading.Event()
+    producer.publish.side_effect = lambda message: blocker.wait(2)
+    publisher = ThreadedRabbitMQProducer(producer, batch_size=10, logger=Mock())
+
+    first = publisher.publish({"n": 0})  # занимает поток публикации
+    second = publisher.publish({"n": 1})
+    closer = threading.Thread(target=publisher.close, kwargs={"timeout": 2})
+    closer.start()
+    while not publisher._closing:
+        pass
+
+    with pytest.raises(ProducerClosedError):
+        publisher.publish({"n": 2})
+    late = Future()
+    publisher._queue.put_nowait(({"n": 3}, late))  # попал в буфер одновременно с close()
+
+    blocker.set()
+    closer.join(2)
+    assert first.result(timeout=0) is None
+    assert second.result(timeout=0) is None  # переданные до close() отправляются
+    with pytest.raises(ProducerClosedError):
+        late.result(timeout=0)
+    producer.close.assert_called()
+
+
+def test_threaded_producer_publish_racing_close_completes():
+    import time
+    producer = make_producer()
+    publisher = ThreadedRabbitMQProducer(producer, logger=Mock())
+    publisher.connect()
+    closer = threading.Thread(target=publisher.close, kwargs={"timeout": 2})
+    put_nowait = publisher._queue.put_nowait
+
+    def slow_put(entry):
+        # close() начинается, когда publish() уже прошёл проверку _closing
+        closer.start()
+        time.sleep(0.05)
+        put_nowait(entry)
+
+    publisher._queue.put_nowait = slow_put
+    future = publisher.publish({"n": 1})
+    closer.join(2)
+
+    assert future.done()
+    assert future.exception() is None